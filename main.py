@@ -1,30 +1,1033 @@
+import io
 import os
 import re
 import time
 import json
+import sys
 import asyncio
 import random
+import bisect
+import itertools
+import concurrent.futures
+import contextvars
 import shutil
+import hashlib
+import pickle
 import urllib.parse
 import aiohttp
 
-from typing import Any, Dict, List, Optional, Tuple
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, NamedTuple, Optional, Tuple, Union
 
 from astrbot.api.event import filter, AstrMessageEvent
 from astrbot.api.star import Context, Star, register
 from astrbot.api import AstrBotConfig, logger
+import astrbot.api.message_components as Comp
 
 PIGHUB_BASE = "https://pighub.top"
 PIGHUB_API  = "https://pighub.top/api/images?sort=2&limit=10000"
 
 # 图片实际下载走 GitHub raw（pighub 直链被 WAF 拦截，GitHub raw 可正常访问）
 GHRAW_BASE  = "https://raw.githubusercontent.com/BadFish-HSrui/PigHub-DB/master/data/"
+# 默认镜像：GitHub raw 优先，jsDelivr 作为备用
+DEFAULT_MIRRORS = [
+    GHRAW_BASE,
+    "https://cdn.jsdelivr.net/gh/BadFish-HSrui/PigHub-DB@master/data/",
+]
+
+DEFAULT_PLATFORM_PROFILES = [
+    "telegram:jpeg,png,gif,webp:4096:5120",
+    "discord:jpeg,png,gif,webp:4096:8192",
+    "webchat:jpeg,png,gif,webp:0:0",
+]
+
+# brotli 仅在安装了 Brotli 解码库时才声明，否则 aiohttp 无法解压
+try:
+    import brotli  # noqa: F401
+    _ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    try:
+        import brotlicffi  # noqa: F401
+        _ACCEPT_ENCODING = "gzip, deflate, br"
+    except ImportError:
+        _ACCEPT_ENCODING = "gzip, deflate"
 
 # 支持的图片后缀（从文件名中识别）
 _VALID_EXT = (".jpg", ".jpeg", ".png", ".gif", ".bmp", ".webp",
               ".avif", ".tiff", ".tif", ".svg", ".ico")
 
 
+# ── 指令解析 ───────────────────────────────────────────────────────────────
+# 正则在模块加载时编译一次；消息中不含 At 标记时跳过对应的替换
+
+_AT_TAG_RE  = re.compile(r"\[At:[^\]]+\]")
+_AT_XML_RE  = re.compile(r"<at[^>]*>.*?</at>", re.I | re.S)
+_SPACES_RE  = re.compile(r"\s+")
+_PIG_CMD_RE = re.compile(r"(?i)^[/／]?pig(?:\s+(.+))?$")
+_SLASH_CMD_RE = re.compile(r"^\s*(?:\[At:[^\]]+\]\s*|<at[^>]*>.*?</at>\s*)*[/／\\﹨]", re.I | re.S)
+
+
+# pig_command 的触发正则：/pig 后接至多三个参数（子命令、选图参数或标题关键词）。
+# 斜杠可省略，但不带斜杠（且未 @ 机器人）的消息只认与旧版一致的 "pig" 和 "pig update"，
+# 其余带参数的形式一律忽略，避免群聊里普通的 "pig xxx" 触发更新、统计、连发或检索
+_PIG_FILTER_RE = r"(?i)^[/／]?pig(?:\s+\S+){0,3}$"
+
+
+class _PigCommand(NamedTuple):
+    """解析后的 /pig 指令：name 为小写子命令（无子命令时为空串），args 为其余参数。"""
+    name: str
+    args: Tuple[str, ...]
+
+
+def _parse_pig_command(text: str) -> Optional[_PigCommand]:
+    m = _PIG_CMD_RE.match(text)
+    if not m:
+        return None
+    parts = (m.group(1) or "").split()
+    if not parts:
+        return _PigCommand("", ())
+    return _PigCommand(parts[0].lower(), tuple(parts[1:]))
+
+
+# ── 远程列表解析 ───────────────────────────────────────────────────────────
+
+def _parse_api_payload(text: str) -> Tuple[Any, Any, Optional[List[dict]]]:
+    """
+    解析 pighub API 响应 {"code", "message", "data": [...]}。整体严格按 JSON 解析，
+    截断或格式错误的响应直接抛出 ValueError，不会被当成条目更少的有效目录；
+    data 中的非对象元素丢弃。返回 (code, message, data)；结构不符时 data 为 None。
+    """
+    payload = json.loads(text)
+    if not isinstance(payload, dict):
+        raise ValueError("响应不是 JSON 对象")
+    data = payload.get("data")
+    if isinstance(data, list):
+        data = [item for item in data if isinstance(item, dict)]
+    else:
+        data = None
+    return payload.get("code"), payload.get("message"), data
+
+
+# ── 图片格式转换 ───────────────────────────────────────────────────────────
+# QQ 官方机器人富媒体 API 仅支持 jpg / png / gif；其他平台可在 platform_profiles
+# 中配置各自允许的格式与尺寸 / 体积上限（转换配置档），未配置的平台沿用 QQ 规则。
+# 下载完成后先嗅探文件头，已符合要求的图片原样透传，其余用 Pillow 转换
+# （在线程池/进程池中执行，不阻塞事件循环）：
+#   配置档允许的格式且未超限 → 原样透传
+#   静态图（单帧）→ JPEG（更小体积，QQ 可靠支持；超出边长 / 体积上限时缩小、降质量）
+#   动图（多帧）  → GIF（共用一个由抽样帧生成的全局调色板；超出帧数 / 尺寸 / 内存上限时抽帧、缩小）
+
+class _ConvertOptions(NamedTuple):
+    """传给转换函数的参数（可 pickle，进程池可用）。0 表示不限制。"""
+    gif_max_frames: int = 150
+    gif_max_edge: int = 480
+    max_edge: int = 2048
+    target_bytes: int = 1024 * 1024
+    jpeg_optimize: bool = True
+    formats: Tuple[str, ...] = ("jpeg", "png", "gif")
+
+
+_OUTPUT_FORMATS = ("jpeg", "png", "gif", "webp")
+
+
+def _parse_profiles(lines: List[str], base: _ConvertOptions) -> Dict[str, _ConvertOptions]:
+    """
+    解析 platform_profiles 配置，每行格式：平台名:格式列表[:最长边[:体积KB]]，
+    例如 "telegram:jpeg,png,gif,webp:4096:5120"；省略的字段沿用全局配置。
+    返回 {平台名: 转换参数}，无法解析的行忽略。
+    """
+    profiles: Dict[str, _ConvertOptions] = {}
+    for line in lines:
+        parts = [p.strip() for p in str(line).split(":")]
+        if len(parts) < 2 or not parts[0]:
+            continue
+        formats = tuple(f for f in (x.strip().lower() for x in parts[1].split(","))
+                        if f in _OUTPUT_FORMATS)
+        if not formats:
+            continue
+        try:
+            max_edge = max(0, int(parts[2])) if len(parts) > 2 and parts[2] else base.max_edge
+            target = max(0, int(parts[3])) * 1024 if len(parts) > 3 and parts[3] else base.target_bytes
+        except ValueError:
+            continue
+        profiles[parts[0].lower()] = base._replace(
+            max_edge=max_edge, target_bytes=target, formats=formats
+        )
+    return profiles
+
+
+_JPEG_QUALITY = 85
+_JPEG_MIN_QUALITY = 40
+_JPEG_SEARCH_STEPS = 4
+
+
+_MAGIC = (
+    (b"\xff\xd8\xff", "jpeg", ".jpg"),
+    (b"\x89PNG\r\n\x1a\n", "png", ".png"),
+    (b"GIF87a", "gif", ".gif"),
+    (b"GIF89a", "gif", ".gif"),
+)
+
+
+def _sniff_format(head: bytes) -> Tuple[Optional[str], str]:
+    for magic, kind, ext in _MAGIC:
+        if head.startswith(magic):
+            return kind, ext
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp", ".webp"
+    return None, ""
+
+
+def _passthrough(src: Union[str, bytes], ext: str, tmp_dir: str) -> str:
+    dst = os.path.join(
+        tmp_dir,
+        f"pig_conv_{int(time.time())}_{random.randint(0, 10**9)}{ext}"
+    )
+    if isinstance(src, str):
+        shutil.copyfile(src, dst)
+    else:
+        with open(dst, "wb") as f:
+            f.write(src)
+    return dst
+
+
+def _convert_image(src: Union[str, bytes], tmp_dir: str,
+                   opts: _ConvertOptions = _ConvertOptions()) -> Optional[str]:
+    """
+    将 src（文件路径，或小图直接传入的原始字节）转换为 QQ 支持的格式后
+    保存为新临时文件，返回新文件路径；失败返回 None（调用方可继续尝试其他候选图）。
+    """
+    src_path = src if isinstance(src, str) else "<内存>"
+    try:
+        from PIL import Image
+    except ImportError:
+        logger.error("[转换] Pillow 未安装，无法转换图片格式")
+        return None
+
+    try:
+        if isinstance(src, str):
+            with open(src, "rb") as f:
+                head = f.read(16)
+        else:
+            head = bytes(src[:16])
+        kind, ext = _sniff_format(head)
+        img = Image.open(src if isinstance(src, str) else io.BytesIO(src))
+    except Exception as e:
+        logger.warning("[转换] 无法打开图片：%s | %s", src_path, e)
+        return None
+
+    # 判断是否是动图（多帧）
+    n_frames = 1
+    try:
+        n_frames = getattr(img, "n_frames", 1)
+    except Exception:
+        n_frames = 1
+    is_animated = n_frames > 1
+
+    try:
+        if (kind in opts.formats and kind != "gif" and not is_animated
+                and _within_limits(src, img.size, opts)):
+            return _passthrough(src, ext, tmp_dir)
+        if kind == "gif" and "gif" in opts.formats and (
+            (not opts.gif_max_frames or n_frames <= opts.gif_max_frames)
+            and (not opts.gif_max_edge or max(img.size) <= opts.gif_max_edge)
+        ):
+            return _passthrough(src, ext, tmp_dir)
+        if is_animated:
+            return _to_gif(img, src_path, tmp_dir, n_frames, opts)
+        else:
+            return _to_jpeg(img, src_path, tmp_dir, opts)
+    except Exception as e:
+        logger.warning("[转换] 处理失败：%s | %s", src_path, e)
+        return None
+    finally:
+        img.close()
+
+
+def _within_limits(src: Union[str, bytes], size: Tuple[int, int],
+                   opts: _ConvertOptions) -> bool:
+    if opts.max_edge and max(size) > opts.max_edge:
+        return False
+    if opts.target_bytes:
+        n = os.path.getsize(src) if isinstance(src, str) else len(src)
+        if n > opts.target_bytes:
+            return False
+    return True
+
+
+def _fit_edge(img, max_edge: int):
+    """
+    将静态图缩小到最长边不超过 max_edge，返回已加载的新图（未超限时原样返回）。
+    JPEG 先用 draft() 在解码阶段按 1/2、1/4、1/8 缩小，再用 reduce() 做整数倍
+    盒式缩小，最后一次 resize 到精确尺寸，避免在全分辨率上做重采样。
+    """
+    from PIL import Image
+    w, h = img.size
+    if not max_edge or max(w, h) <= max_edge:
+        return img
+    ratio = max_edge / max(w, h)
+    target = (max(1, round(w * ratio)), max(1, round(h * ratio)))
+    if img.format == "JPEG":
+        img.draft("RGB", target)
+    factor = min(img.size[0] // target[0], img.size[1] // target[1])
+    if factor >= 2:
+        img = img.reduce(factor)
+    if img.size != target:
+        img = img.resize(target, Image.LANCZOS)
+    return img
+
+
+def _encode_jpeg(frame, quality: int, optimize: bool) -> bytes:
+    buf = io.BytesIO()
+    frame.save(buf, format="JPEG", quality=quality, optimize=optimize)
+    return buf.getvalue()
+
+
+def _to_jpeg(img, src_path: str, tmp_dir: str, opts: _ConvertOptions) -> Optional[str]:
+    """
+    静态图 → JPEG。先按 max_edge 缩小；设置了 target_bytes 时，在
+    [_JPEG_MIN_QUALITY, _JPEG_QUALITY] 内对质量做有限次数的二分查找，
+    取不超过体积预算的最高质量；最低质量仍超出时按比例再缩小一次。
+    """
+    try:
+        t0 = time.perf_counter()
+        from PIL import Image
+        frame = _fit_edge(img, opts.max_edge)
+        # RGBA / P 模式需先转 RGB，否则保存 JPEG 会报错
+        if frame.mode not in ("RGB", "L"):
+            frame = frame.convert("RGB")
+
+        # 试探编码不开 optimize（更快），最终输出时再按配置决定
+        quality = _JPEG_QUALITY
+        data = _encode_jpeg(frame, quality, False)
+        if opts.target_bytes and len(data) > opts.target_bytes:
+            lo, hi = _JPEG_MIN_QUALITY, _JPEG_QUALITY - 1
+            best = None
+            for _ in range(_JPEG_SEARCH_STEPS):
+                if lo > hi:
+                    break
+                mid = (lo + hi) // 2
+                probe = _encode_jpeg(frame, mid, False)
+                if len(probe) <= opts.target_bytes:
+                    best, quality = probe, mid
+                    lo = mid + 1
+                else:
+                    hi = mid - 1
+            if best is None:
+                quality = _JPEG_MIN_QUALITY
+                probe = _encode_jpeg(frame, quality, False)
+                if len(probe) > opts.target_bytes:
+                    # 体积与像素数近似成正比，按面积比例缩小
+                    scale = (opts.target_bytes / len(probe)) ** 0.5 * 0.9
+                    size = (max(1, int(frame.width * scale)), max(1, int(frame.height * scale)))
+                    frame = frame.resize(size, Image.LANCZOS)
+                    probe = _encode_jpeg(frame, quality, False)
+                best = probe
+            data = best
+        if opts.jpeg_optimize:
+            data = _encode_jpeg(frame, quality, True)
+
+        dst = os.path.join(
+            tmp_dir,
+            f"pig_conv_{int(time.time())}_{random.randint(0, 10**9)}.jpg"
+        )
+        with open(dst, "wb") as f:
+            f.write(data)
+        logger.debug(
+            "[转换] %s → JPEG %dx%d q=%d %dKB %.0fms (%s)",
+            os.path.basename(src_path), frame.width, frame.height, quality,
+            len(data) // 1024, (time.perf_counter() - t0) * 1000, os.path.basename(dst)
+        )
+        frame.close()
+        return dst
+    except Exception as e:
+        logger.warning("[转换] 转 JPEG 失败：%s | %s", src_path, e)
+        return None
+
+
+# GIF 编码器（Pillow）会把所有帧收集齐后才开始写文件，保留帧的总像素数（P 模式每像素 1 字节）
+# 超过该预算时进一步抽帧；调色板从至多 _PALETTE_SAMPLES 帧的缩略图拼板中生成
+_GIF_PIXEL_BUDGET = 16 * 1024 * 1024
+_PALETTE_SAMPLES = 16
+_PALETTE_TILE = 128
+
+
+def _sample_palette(img, n_frames: int):
+    """
+    均匀抽取至多 _PALETTE_SAMPLES 帧缩小后横向拼成一张图，对其做 median cut，
+    得到覆盖整段动画配色的全局调色板（首帧为黑屏 / 纯色片头时也不会只剩一种颜色）。
+    """
+    from PIL import Image
+    stride = max(1, -(-n_frames // _PALETTE_SAMPLES))
+    picks = range(0, n_frames, stride)
+    w, h = img.size
+    ratio = min(1.0, _PALETTE_TILE / max(w, h))
+    tile = (max(1, round(w * ratio)), max(1, round(h * ratio)))
+    montage = Image.new("RGB", (tile[0] * len(picks), tile[1]))
+    for j, i in enumerate(picks):
+        img.seek(i)
+        thumb = img.convert("RGB").resize(tile, Image.BOX)
+        montage.paste(thumb, (j * tile[0], 0))
+        thumb.close()
+    img.seek(0)
+    palette = montage.quantize(colors=256, method=Image.MEDIANCUT)
+    montage.close()
+    return palette
+
+
+def _to_gif(img, src_path: str, tmp_dir: str, n_frames: int,
+            opts: _ConvertOptions) -> Optional[str]:
+    """
+    动图 → GIF。先从抽样帧生成全局调色板，再逐帧解码并映射到该调色板，
+    以生成器形式交给 GIF 编码器（编码器内部仍会缓存全部保留帧，内存由下面的抽帧上限约束）。
+    帧数超过 gif_max_frames、或保留帧总像素超过 _GIF_PIXEL_BUDGET 时等间隔抽帧
+    （被跳过帧的时长并入保留帧），边长超过 gif_max_edge 时等比缩小。
+    """
+    try:
+        from PIL import Image, ImageSequence
+
+        size = img.size
+        if opts.gif_max_edge and max(size) > opts.gif_max_edge:
+            ratio = opts.gif_max_edge / max(size)
+            size = (max(1, round(size[0] * ratio)), max(1, round(size[1] * ratio)))
+        max_frames = max(1, _GIF_PIXEL_BUDGET // (size[0] * size[1]))
+        if opts.gif_max_frames:
+            max_frames = min(max_frames, opts.gif_max_frames)
+        step = -(-n_frames // max_frames) if n_frames > max_frames else 1
+
+        palette = _sample_palette(img, n_frames)
+        count = [0]
+
+        def quantize(frame):
+            rgb = frame.convert("RGB")
+            if rgb.size != size:
+                rgb = rgb.resize(size, Image.BOX)
+            q = rgb.quantize(palette=palette, dither=Image.NONE)
+            rgb.close()
+            return q
+
+        def frames():
+            pending = None
+            for i, frame in enumerate(ImageSequence.Iterator(img)):
+                dur = int(frame.info.get("duration", 100) or 100)
+                if i % step == 0:
+                    if pending is not None:
+                        pending.info["duration"] = max(20, pending.info["duration"])  # 最低 20ms 防止过快
+                        count[0] += 1
+                        yield pending
+                    pending = quantize(frame)
+                    pending.info["duration"] = dur
+                elif pending is not None:
+                    pending.info["duration"] += dur
+            if pending is not None:
+                pending.info["duration"] = max(20, pending.info["duration"])
+                count[0] += 1
+                yield pending
+
+        it = frames()
+        first = next(it, None)
+        if first is None:
+            return None
+
+        dst = os.path.join(
+            tmp_dir,
+            f"pig_conv_{int(time.time())}_{random.randint(0, 10**9)}.gif"
+        )
+        first.save(
+            dst,
+            format="GIF",
+            save_all=True,
+            append_images=it,
+            loop=0,
+            optimize=False,
+        )
+        logger.debug(
+            "[转换] %s → GIF (%d 帧, %s)",
+            os.path.basename(src_path), count[0], os.path.basename(dst)
+        )
+        return dst
+    except Exception as e:
+        logger.warning("[转换] 转 GIF 失败：%s | %s", src_path, e)
+        return None
+
+
+# ── 目录条目 ───────────────────────────────────────────────────────────────
+
+_PIG_IMAGE_FIELDS = frozenset((
+    "title", "full_url", "path", "filename", "id", "mtime", "popularity", "animated",
+))
+
+
+class _PigImage:
+    """
+    紧凑的目录条目：__slots__ 存储，标题驻留（intern）共享，
+    path / full_url 不预先展开，访问时由文件名和首选镜像前缀现算。
+    支持 .get() / [] 访问，与原先的 dict 条目用法保持一致。
+    """
+
+    __slots__ = ("title", "filename", "id", "mtime", "base", "popularity", "animated")
+
+    def __init__(self, title: Any, filename: str, ident: Any, mtime: Any, base: str,
+                 popularity: int = 0, animated: bool = False):
+        self.title = sys.intern(title) if isinstance(title, str) else title
+        self.filename = filename
+        self.id = ident
+        self.mtime = mtime
+        self.base = base
+        self.popularity = popularity
+        self.animated = animated
+
+    @property
+    def uid(self) -> str:
+        """条目唯一标识，用于去重与不重复窗口。"""
+        return str(self.id) if self.id is not None else "f:" + self.filename
+
+    @property
+    def path(self) -> str:
+        return urllib.parse.quote(self.filename, safe="")
+
+    @property
+    def full_url(self) -> str:
+        return self.base + self.path
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key not in _PIG_IMAGE_FIELDS:
+            return default
+        value = getattr(self, key)
+        return default if value is None else value
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in _PIG_IMAGE_FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+
+# ── 选图引擎 ───────────────────────────────────────────────────────────────
+# 策略：uniform 均匀随机 / popular 按浏览+下载量加权 / recent 按上传时间指数衰减加权
+# 过滤：all / static 仅静图 / animated 仅动图
+# 每种 (策略, 过滤) 组合首次使用时构建候选下标与累积权重表，之后 O(log n) 二分抽样；
+# 目录变化时整体作废重建。
+
+SELECT_STRATEGIES = ("uniform", "popular", "recent")
+SELECT_FILTERS    = ("all", "static", "animated")
+
+# /pig 参数别名 → ("strategy" | "filter", 取值)
+_SELECT_ALIASES = {
+    "uniform": ("strategy", "uniform"), "随机": ("strategy", "uniform"),
+    "hot":     ("strategy", "popular"), "popular": ("strategy", "popular"), "热门": ("strategy", "popular"),
+    "new":     ("strategy", "recent"),  "recent":  ("strategy", "recent"),  "最新": ("strategy", "recent"),
+    "static":  ("filter", "static"),    "静图": ("filter", "static"),
+    "gif":     ("filter", "animated"),  "animated": ("filter", "animated"), "动图": ("filter", "animated"),
+}
+
+
+class _Selector:
+    RECENT_HALF_LIFE = 30 * 86400
+
+    def __init__(self):
+        self._images: List[_PigImage] = []
+        self._tables: Dict[Tuple[str, str], Tuple[Any, Optional[List[float]]]] = {}
+
+    def rebuild(self, images: List[_PigImage]):
+        self._images = images
+        self._tables.clear()
+
+    def _table(self, strategy: str, image_filter: str) -> Tuple[Any, Optional[List[float]]]:
+        key = (strategy, image_filter)
+        table = self._tables.get(key)
+        if table is not None:
+            return table
+        images = self._images
+        if image_filter == "all":
+            pool: Any = range(len(images))
+        else:
+            want = image_filter == "animated"
+            pool = [i for i, img in enumerate(images) if img.animated == want]
+        cum: Optional[List[float]] = None
+        if strategy == "popular":
+            cum = list(itertools.accumulate(1.0 + images[i].popularity for i in pool))
+        elif strategy == "recent":
+            mtimes = [images[i].mtime if isinstance(images[i].mtime, (int, float)) else 0 for i in pool]
+            newest = max(mtimes, default=0)
+            cum = list(itertools.accumulate(
+                0.5 ** ((newest - m) / self.RECENT_HALF_LIFE) for m in mtimes
+            ))
+        table = (pool, cum)
+        self._tables[key] = table
+        return table
+
+    def draw(self, strategy: str, image_filter: str) -> Optional[_PigImage]:
+        pool, cum = self._table(strategy, image_filter)
+        if not pool:
+            return None
+        if cum is None:
+            return self._images[pool[random.randrange(len(pool))]]
+        pos = bisect.bisect_right(cum, random.random() * cum[-1])
+        return self._images[pool[min(pos, len(pool) - 1)]]
+
+    def sample(self, k: int, strategy: str, image_filter: str,
+               exclude: Optional[Any] = None) -> List[_PigImage]:
+        """抽取至多 k 张互不相同的图，尽量避开 exclude 中的 uid；候选不足时放宽限制。"""
+        picked: List[_PigImage] = []
+        seen: set = set()
+        for avoid in (exclude, None):
+            for _ in range(k * 8):
+                if len(picked) >= k:
+                    return picked
+                img = self.draw(strategy, image_filter)
+                if img is None:
+                    return picked
+                uid = img.uid
+                if uid in seen or (avoid is not None and uid in avoid):
+                    continue
+                seen.add(uid)
+                picked.append(img)
+            if not exclude:
+                break
+        return picked
+
+
+class _RecentWindow:
+    """每个会话最近发送过的 uid（有序集合，超出 size 淘汰最早的），会话数上限 max_chats。"""
+
+    def __init__(self, size: int, max_chats: int = 1000):
+        self.size = size
+        self.max_chats = max_chats
+        self._chats: "OrderedDict[str, OrderedDict[str, None]]" = OrderedDict()
+
+    def get(self, chat: str) -> Optional["OrderedDict[str, None]"]:
+        return self._chats.get(chat)
+
+    def add(self, chat: str, uid: str):
+        if self.size <= 0:
+            return
+        window = self._chats.get(chat)
+        if window is None:
+            window = self._chats[chat] = OrderedDict()
+            if len(self._chats) > self.max_chats:
+                self._chats.popitem(last=False)
+        else:
+            self._chats.move_to_end(chat)
+        window[uid] = None
+        window.move_to_end(uid)
+        if len(window) > self.size:
+            window.popitem(last=False)
+
+
+# ── 标题检索 ───────────────────────────────────────────────────────────────
+
+class _TitleIndex:
+    """
+    标题倒排索引：每个标题（小写）拆成单字与相邻二字组（适合中文短标题），
+    gram → 条目集合。查询时取关键词全部二字组（单字关键词取其本身）的
+    倒排集合求交，再用子串校验排除误命中，无需逐条扫描。支持增量增删。
+    """
+
+    def __init__(self):
+        self._grams: Dict[str, set] = {}
+
+    @staticmethod
+    def _grams_of(text: str) -> set:
+        return {text[i:i + n] for n in (1, 2) for i in range(len(text) - n + 1)}
+
+    def rebuild(self, images: List[_PigImage]):
+        self._grams = {}
+        for img in images:
+            self.add(img)
+
+    def add(self, img: _PigImage):
+        if not isinstance(img.title, str):
+            return
+        for g in self._grams_of(img.title.lower()):
+            self._grams.setdefault(g, set()).add(img)
+
+    def remove(self, img: _PigImage):
+        if not isinstance(img.title, str):
+            return
+        for g in self._grams_of(img.title.lower()):
+            posting = self._grams.get(g)
+            if posting is None:
+                continue
+            posting.discard(img)
+            if not posting:
+                del self._grams[g]
+
+    def search(self, keyword: str) -> List[_PigImage]:
+        kw = keyword.strip().lower()
+        if not kw:
+            return []
+        terms = kw.split()
+        if len(terms) > 1:
+            # 多个关键词：标题需同时包含每一个
+            result: Optional[set] = None
+            for term in terms:
+                hits = set(self.search(term))
+                result = hits if result is None else result & hits
+                if not result:
+                    return []
+            return list(result)
+        grams = {kw[i:i + 2] for i in range(len(kw) - 1)} if len(kw) > 1 else {kw}
+        postings = []
+        for g in grams:
+            posting = self._grams.get(g)
+            if not posting:
+                return []
+            postings.append(posting)
+        postings.sort(key=len)
+        hits = postings[0].intersection(*postings[1:])
+        if len(kw) <= 2:
+            return list(hits)
+        return [img for img in hits if kw in img.title.lower()]
+
+
+# ── 镜像源 ─────────────────────────────────────────────────────────────────
+
+class _Mirror:
+    """
+    单个图片镜像源及其健康度：延迟与错误率均用 EWMA 平滑。
+    错误率过高时暂时下线 DOWN_SECONDS 秒，到期后重新参与选择。
+    """
+
+    __slots__ = ("base", "latency", "error_rate", "down_until")
+
+    ALPHA        = 0.3
+    DOWN_RATE    = 0.5
+    DOWN_SECONDS = 60
+
+    def __init__(self, base: str):
+        self.base = base if base.endswith("/") else base + "/"
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.down_until = 0.0
+
+    def record(self, ok: bool, elapsed: Optional[float] = None):
+        a = self.ALPHA
+        self.error_rate = (1 - a) * self.error_rate + a * (0.0 if ok else 1.0)
+        if ok and elapsed is not None:
+            self.latency = elapsed if self.latency is None else (1 - a) * self.latency + a * elapsed
+        if not ok and self.error_rate >= self.DOWN_RATE:
+            self.down_until = time.monotonic() + self.DOWN_SECONDS
+
+    def healthy(self, now: float) -> bool:
+        return now >= self.down_until
+
+    def score(self) -> float:
+        # 从未成功过的镜像：无失败记录按 0 延迟处理（确保会被探测），有失败记录按 1 秒计
+        latency = self.latency
+        if latency is None:
+            latency = 1.0 if self.error_rate > 0 else 0.0
+        return latency * (1.0 + 4.0 * self.error_rate)
+
+
+# ── 冷却限流 ───────────────────────────────────────────────────────────────
+
+class _ByteRateLimiter:
+    """
+    所有调用方共享的字节令牌桶：每秒恢复 rate 字节，最多累积 1 秒的量。
+    consume 先记账再等待，令牌透支时按欠额睡眠，多个并发调用方的总速率仍为 rate。
+    """
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = rate
+        self.stamp = time.monotonic()
+
+    async def consume(self, n: int):
+        now = time.monotonic()
+        self.tokens = min(self.rate, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        self.tokens -= n
+        if self.tokens < 0:
+            await asyncio.sleep(-self.tokens / self.rate)
+
+
+class _CooldownLimiter:
+    """
+    按 key 的令牌桶：每 period 秒恢复 1 个令牌，最多累积 burst 个。
+    内部用 OrderedDict 按最近使用排序，闲置超过 period * burst 秒的 key
+    （此时令牌必然已满，与不存在等价）在写入时从队首顺带清除；
+    key 数超过 max_keys 时淘汰最久未用的。check / charge 均摊 O(1)。
+    """
+
+    def __init__(self, period: float, burst: int = 1, max_keys: int = 10000):
+        self.period = max(0.0, period)
+        self.burst = max(1, burst)
+        self.max_keys = max(1, max_keys)
+        self._ttl = self.period * self.burst
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def _tokens(self, key: str, now: float) -> float:
+        entry = self._buckets.get(key)
+        if entry is None:
+            return float(self.burst)
+        tokens, ts = entry
+        return min(float(self.burst), tokens + (now - ts) / self.period)
+
+    def check(self, key: str) -> Tuple[bool, float]:
+        """返回 (是否处于冷却, 剩余秒数)，不消耗令牌。"""
+        if self.period <= 0:
+            return False, 0.0
+        tokens = self._tokens(key, time.monotonic())
+        if tokens >= 1.0:
+            return False, 0.0
+        return True, (1.0 - tokens) * self.period
+
+    def charge(self, key: str):
+        if self.period <= 0:
+            return
+        now = time.monotonic()
+        tokens = max(0.0, self._tokens(key, now) - 1.0)
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        while self._buckets:
+            oldest_key, (_, ts) = next(iter(self._buckets.items()))
+            if now - ts <= self._ttl and len(self._buckets) <= self.max_keys:
+                break
+            del self._buckets[oldest_key]
+
+
+# ── 关键词匹配 ─────────────────────────────────────────────────────────────
+
+class _KeywordMatcher:
+    """
+    关键词匹配器：精确匹配用 frozenset，模糊匹配把全部关键词编译成
+    一个正则交替式（长词在前），每条消息只需一次 C 层扫描。
+    """
+
+    __slots__ = ("exact", "pattern", "fuzzy")
+
+    def __init__(self, keywords: List[str], fuzzy: bool):
+        words = [str(k) for k in keywords if str(k)]
+        self.exact = frozenset(words)
+        self.fuzzy = fuzzy
+        self.pattern = None
+        if fuzzy and words:
+            alternation = "|".join(re.escape(w) for w in sorted(set(words), key=len, reverse=True))
+            self.pattern = re.compile(alternation)
+
+    def match(self, message: str) -> bool:
+        if message.strip() in self.exact:
+            return True
+        return self.pattern is not None and self.pattern.search(message) is not None
+
+
+# ── 磁盘 LRU 缓存 ──────────────────────────────────────────────────────────
+
+class _DiskLRUCache:
+    """
+    目录级 LRU 缓存：内存中维护 key → (文件名, 字节数) 的有序索引，
+    超出 max_bytes 时按最久未使用淘汰。启动时扫描一次目录重建索引
+    （按文件 mtime 排序近似恢复使用顺序），之后查询不再访问磁盘。
+    max_bytes <= 0 表示不限制容量。
+    """
+
+    def __init__(self, directory: str, max_bytes: int,
+                 key_of: Optional[Callable[[str], str]] = None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._key_of = key_of or (lambda fn: os.path.splitext(fn)[0])
+        self._index: "OrderedDict[str, Tuple[str, int]]" = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def load(self):
+        os.makedirs(self.directory, exist_ok=True)
+        entries = []
+        with os.scandir(self.directory) as it:
+            for de in it:
+                if de.name.startswith(".") or not de.is_file():
+                    continue
+                try:
+                    st = de.stat()
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, de.name, st.st_size))
+        entries.sort()
+        self._index.clear()
+        self.total_bytes = 0
+        for _, name, size in entries:
+            self._index[self._key_of(name)] = (name, size)
+            self.total_bytes += size
+        self._evict()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._index.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._index.move_to_end(key)
+        self.hits += 1
+        return os.path.join(self.directory, entry[0])
+
+    def keys(self) -> List[str]:
+        return list(self._index)
+
+    def put(self, key: str, src_path: str, filename: Optional[str] = None,
+            copy: bool = False) -> str:
+        """
+        将 src_path 移入缓存目录（同盘 os.replace；copy=True 时复制后原子替换），
+        返回缓存内路径。
+        """
+        if filename is None:
+            filename = key + os.path.splitext(src_path)[1]
+        dst = os.path.join(self.directory, filename)
+        size = os.path.getsize(src_path)
+        if copy:
+            tmp = os.path.join(self.directory, f".tmp_{int(time.time())}_{random.randint(0, 10**9)}")
+            shutil.copy2(src_path, tmp)
+            os.replace(tmp, dst)
+        else:
+            os.replace(src_path, dst)
+        self.discard(key, remove_file=False)
+        self._index[key] = (filename, size)
+        self.total_bytes += size
+        self._evict(keep=key)
+        return dst
+
+    def discard(self, key: str, remove_file: bool = True):
+        entry = self._index.pop(key, None)
+        if entry is None:
+            return
+        self.total_bytes -= entry[1]
+        if remove_file:
+            try:
+                os.remove(os.path.join(self.directory, entry[0]))
+            except OSError:
+                pass
+
+    def _evict(self, keep: Optional[str] = None):
+        if self.max_bytes <= 0:
+            return
+        while self.total_bytes > self.max_bytes and self._index:
+            key = next(iter(self._index))
+            if key == keep:
+                if len(self._index) == 1:
+                    break
+                self._index.move_to_end(key)
+                continue
+            self.discard(key)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries":   len(self._index),
+            "bytes":     self.total_bytes,
+            "hits":      self.hits,
+            "misses":    self.misses,
+            "evictions": self.evictions,
+        }
+
+
+# ── 运行指标 ───────────────────────────────────────────────────────────────
+# 各阶段耗时记入固定分桶直方图（每次观测一次 bisect 加几次加法），常驻开启无明显开销。
+# 通过 /pig stats 查看，或配置 metrics_file 定期导出为 Prometheus 文本格式。
+
+_METRIC_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_METRIC_STAGES = {
+    "cooldown":   "冷却检查",
+    "select":     "选图",
+    "cache":      "缓存查找",
+    "network":    "下载",
+    "convert":    "格式转换",
+    "local_save": "本地保存",
+    "send":       "发送",
+    "request":    "整次请求",
+}
+
+
+# 预取 / 预热任务中置为 True（其中创建的子任务自动继承）：这些后台下载不计入
+# 用户请求的阶段耗时，只单独累计流量，避免限速的预热流量拉高请求耗时统计
+_BACKGROUND_FETCH: "contextvars.ContextVar[bool]" = contextvars.ContextVar(
+    "pig_background_fetch", default=False
+)
+
+
+class _Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(_METRIC_BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(_METRIC_BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """按分桶上界估算分位数（落在最后一个桶时返回 inf）。"""
+        rank = q * self.count
+        acc = 0
+        for i, c in enumerate(self.counts):
+            acc += c
+            if c and acc >= rank:
+                return _METRIC_BUCKETS[i] if i < len(_METRIC_BUCKETS) else float("inf")
+        return 0.0
+
+
+class _Metrics:
+    """阶段耗时直方图 + 事件计数器。"""
+
+    def __init__(self):
+        self.started = time.time()
+        self.stages: Dict[str, _Histogram] = {name: _Histogram() for name in _METRIC_STAGES}
+        self.counters: Dict[str, int] = {}
+
+    def observe(self, stage: str, seconds: float):
+        self.stages[stage].observe(seconds)
+
+    def incr(self, name: str, n: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def summary(self) -> List[str]:
+        lines = []
+        for name, label in _METRIC_STAGES.items():
+            h = self.stages[name]
+            if not h.count:
+                continue
+            lines.append(
+                f"{label}：{h.count} 次，平均 {h.total / h.count * 1000:.1f}ms，"
+                f"p50≤{h.quantile(0.5) * 1000:g}ms，p95≤{h.quantile(0.95) * 1000:g}ms"
+            )
+        return lines
+
+    def prometheus(self, gauges: Dict[str, float]) -> str:
+        out = [
+            "# HELP pig_stage_seconds Time spent per request stage.",
+            "# TYPE pig_stage_seconds histogram",
+        ]
+        for name, h in self.stages.items():
+            acc = 0
+            for bound, c in zip(_METRIC_BUCKETS + (float("inf"),), h.counts):
+                acc += c
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                out.append(f'pig_stage_seconds_bucket{{stage="{name}",le="{le}"}} {acc}')
+            out.append(f'pig_stage_seconds_sum{{stage="{name}"}} {h.total:.6f}')
+            out.append(f'pig_stage_seconds_count{{stage="{name}"}} {h.count}')
+        out.append("# HELP pig_events_total Event counters.")
+        out.append("# TYPE pig_events_total counter")
+        for name, n in sorted(self.counters.items()):
+            out.append(f'pig_events_total{{event="{name}"}} {n}')
+        for name, value in gauges.items():
+            out.append(f"# TYPE pig_{name} gauge")
+            out.append(f"pig_{name} {value}")
+        return "\n".join(out) + "\n"
+
+
 @register("astrbot_plugin_pig", "SakuraMikku", "随机发送猪相关图片", "0.1.6")
 class PigRandomImagePlugin(Star):
     def __init__(self, context: Context, config: AstrBotConfig):
@@ -69,24 +1072,270 @@ class PigRandomImagePlugin(Star):
         except Exception:
             self.exclude_prefixes = ("/", "!", "！", "#", "ww")
 
-        self.last_called_times: Dict[str, float] = {}
-        self.pig_images: List[Dict[str, Any]] = []
+        # 连接池：整个插件生命周期共用一个 ClientSession，复用 TCP/TLS 连接
+        try:
+            self.http_pool_size = max(1, int(config.get("http_pool_size", 20)))
+        except Exception:
+            self.http_pool_size = 20
+
+        try:
+            self.http_limit_per_host = max(0, int(config.get("http_limit_per_host", 6)))
+        except Exception:
+            self.http_limit_per_host = 6
+
+        try:
+            self.http_keepalive_timeout = max(0.0, float(config.get("http_keepalive_timeout", 30)))
+        except Exception:
+            self.http_keepalive_timeout = 30.0
+
+        try:
+            self.http_dns_cache_ttl = max(0, int(config.get("http_dns_cache_ttl", 300)))
+        except Exception:
+            self.http_dns_cache_ttl = 300
+
+        # 图片转换池：thread / process；池满时最多排队 convert_queue_size 个任务
+        pool_type = str(config.get("convert_pool_type", "thread") or "thread").lower()
+        self.convert_pool_type = pool_type if pool_type in ("thread", "process") else "thread"
+
+        try:
+            self.convert_workers = max(1, int(config.get("convert_workers", 2)))
+        except Exception:
+            self.convert_workers = 2
+
+        try:
+            self.convert_queue_size = max(0, int(config.get("convert_queue_size", 4)))
+        except Exception:
+            self.convert_queue_size = 4
+
+        try:
+            self.convert_wait_timeout = max(0.0, float(config.get("convert_wait_timeout", 10)))
+        except Exception:
+            self.convert_wait_timeout = 10.0
+
+        # 转换结果缓存（按图片 id/filename + mtime 寻址），0 为关闭
+        try:
+            self.converted_cache_mb = max(0, int(config.get("converted_cache_mb", 200)))
+        except Exception:
+            self.converted_cache_mb = 200
+
+        # 预取：后台保持 prefetch_depth 张已转换好的随机图，0 为关闭
+        try:
+            self.prefetch_depth = max(0, int(config.get("prefetch_depth", 3)))
+        except Exception:
+            self.prefetch_depth = 3
+
+        try:
+            self.prefetch_concurrency = max(1, int(config.get("prefetch_concurrency", 1)))
+        except Exception:
+            self.prefetch_concurrency = 1
+
+        # 本地图片目录（load_to_local）容量上限（MB，0 为不限制），超出按最久未使用淘汰
+        try:
+            self.local_cache_mb = max(0, int(config.get("local_cache_mb", 500)))
+        except Exception:
+            self.local_cache_mb = 500
+
+        # 临时文件清理：每 tmp_janitor_interval 秒删除超过 tmp_max_age 秒仍未释放的临时文件
+        try:
+            self.tmp_janitor_interval = max(10.0, float(config.get("tmp_janitor_interval", 600)))
+        except Exception:
+            self.tmp_janitor_interval = 600.0
+
+        try:
+            self.tmp_max_age = max(60.0, float(config.get("tmp_max_age", 3600)))
+        except Exception:
+            self.tmp_max_age = 3600.0
+
+        # 动图转 GIF 的帧数 / 边长上限（0 为不限制），超出时抽帧、等比缩小
+        try:
+            gif_max_frames = max(0, int(config.get("gif_max_frames", 150)))
+        except Exception:
+            gif_max_frames = 150
+
+        try:
+            gif_max_edge = max(0, int(config.get("gif_max_edge", 480)))
+        except Exception:
+            gif_max_edge = 480
+
+        # 静态图输出的最长边（像素）与体积预算（KB），0 为不限制；
+        # 关闭 jpeg_optimize 可省去一次哈夫曼表优化编码，换取更低的转换延迟
+        try:
+            output_max_edge = max(0, int(config.get("output_max_edge", 2048)))
+        except Exception:
+            output_max_edge = 2048
+
+        try:
+            output_target_kb = max(0, int(config.get("output_target_kb", 1024)))
+        except Exception:
+            output_target_kb = 1024
+
+        jpeg_optimize = bool(config.get("jpeg_optimize", True))
+
+        self._convert_opts = _ConvertOptions(
+            gif_max_frames, gif_max_edge,
+            output_max_edge, output_target_kb * 1024, jpeg_optimize,
+        )
+
+        # 各平台的转换配置档：{平台名: 转换参数}，未列出的平台使用上面的默认配置
+        try:
+            profile_lines = list(config.get("platform_profiles", DEFAULT_PLATFORM_PROFILES) or [])
+        except Exception:
+            profile_lines = []
+        self._profiles: Dict[str, _ConvertOptions] = _parse_profiles(profile_lines, self._convert_opts)
+
+        # 下载体积上限（MB，0 为不限制）与内存直接解码阈值（KB）
+        try:
+            self.max_download_mb = max(0, int(config.get("max_download_mb", 20)))
+        except Exception:
+            self.max_download_mb = 20
+
+        try:
+            self.inmemory_decode_kb = max(0, int(config.get("inmemory_decode_kb", 1024)))
+        except Exception:
+            self.inmemory_decode_kb = 1024
+
+        # 对冲下载：候选图超过 hedge_delay 秒未完成时并行启动下一张（0 为关闭，顺序尝试）
+        try:
+            self.hedge_delay = max(0.0, float(config.get("hedge_delay", 0)))
+        except Exception:
+            self.hedge_delay = 0.0
+
+        # 图片镜像源：按 EWMA 延迟 / 错误率选择最快的健康镜像，失败自动切换
+        try:
+            mirrors = [str(m).strip() for m in config.get("mirrors", DEFAULT_MIRRORS) if str(m).strip()]
+        except Exception:
+            mirrors = []
+        self._mirrors: List[_Mirror] = [
+            _Mirror(m) for m in (mirrors or DEFAULT_MIRRORS) if self._is_valid_url(m)
+        ] or [_Mirror(GHRAW_BASE)]
+
+        # 冷却范围：global / group / user / group_user；burst > 1 时允许短时连发
+        scope = str(config.get("cooldown_scope", "global") or "global").lower()
+        self.cooldown_scope = scope if scope in ("global", "group", "user", "group_user") else "global"
+
+        try:
+            self.cooldown_burst = max(1, int(config.get("cooldown_burst", 1)))
+        except Exception:
+            self.cooldown_burst = 1
+
+        self._cooldown = _CooldownLimiter(self.cooldown_period, self.cooldown_burst)
+
+        # 预热：批量下载并转换目录中的图片（全部或热度前 N 张）
+        self.warm_on_startup = bool(config.get("warm_on_startup", False))
+
+        try:
+            self.warm_top_n = max(0, int(config.get("warm_top_n", 0)))
+        except Exception:
+            self.warm_top_n = 0
+
+        try:
+            self.warm_concurrency = max(1, int(config.get("warm_concurrency", 2)))
+        except Exception:
+            self.warm_concurrency = 2
+
+        try:
+            self.warm_rate_kbps = max(0, int(config.get("warm_rate_kbps", 512)))
+        except Exception:
+            self.warm_rate_kbps = 512
+
+        # 选图策略与过滤（/pig 参数可临时覆盖），以及每个会话的不重复窗口
+        strategy = str(config.get("select_strategy", "uniform") or "uniform").lower()
+        self.select_strategy = strategy if strategy in SELECT_STRATEGIES else "uniform"
+
+        image_filter = str(config.get("select_filter", "all") or "all").lower()
+        self.select_filter = image_filter if image_filter in SELECT_FILTERS else "all"
+
+        try:
+            self.no_repeat_window = max(0, int(config.get("no_repeat_window", 20)))
+        except Exception:
+            self.no_repeat_window = 20
+
+        self._selector = _Selector()
+        self._title_index = _TitleIndex()
+        self._recent = _RecentWindow(self.no_repeat_window)
+
+        # 运行指标导出：metrics_file 为 Prometheus 文本文件路径（相对路径基于插件目录，留空关闭）
+        self.metrics_file = str(config.get("metrics_file", "") or "").strip()
+
+        try:
+            self.metrics_dump_interval = max(5.0, float(config.get("metrics_dump_interval", 60)))
+        except Exception:
+            self.metrics_dump_interval = 60.0
+
+        # /pig <n> 一次最多发送的张数
+        try:
+            self.batch_max = max(1, int(config.get("batch_max", 5)))
+        except Exception:
+            self.batch_max = 5
+
+        self._matcher: Optional[_KeywordMatcher] = None
+        self._matcher_src: Tuple[Any, bool] = (None, False)
+        self.pig_images: List[_PigImage] = []
+        # 目录键 → (签名, 条目)，用于远程同步时做增量对比
+        self._catalog_entries: Dict[str, Tuple[Tuple[Any, Any], _PigImage]] = {}
 
         base_dir = os.path.dirname(__file__)
         self.local_img_dir = os.path.join(base_dir, "imgs", "pig")
         self.json_path     = os.path.join(base_dir, "list.json")
+        self._fetch_meta_path = os.path.join(base_dir, "list_meta.json")
+        self._snapshot_path   = os.path.join(base_dir, "list_snapshot.pkl")
+        self._warm_state_path = os.path.join(base_dir, "warm_state.json")
+        self._fetch_meta: Dict[str, str] = {}
+        self._pending_fetch_meta: Optional[Tuple[Optional[str], Optional[str]]] = None
         self._tmp_dir      = os.path.join(base_dir, "imgs", "tmp")
+        self._cache_dir    = os.path.join(base_dir, "imgs", "cache")
         try:
             os.makedirs(self._tmp_dir, exist_ok=True)
         except OSError:
             self._tmp_dir = "/tmp"
 
+        if self.metrics_file and not os.path.isabs(self.metrics_file):
+            self.metrics_file = os.path.join(base_dir, self.metrics_file)
+        self._metrics = _Metrics()
+        self._metrics_task: Optional[asyncio.Task] = None
+
         self._download_semaphore = asyncio.Semaphore(3)
+        # 预热使用独立的下载槽位与全局限速，不占用用户请求的下载并发
+        self._warm_semaphore = asyncio.Semaphore(self.warm_concurrency)
+        self._warm_limiter = (
+            _ByteRateLimiter(self.warm_rate_kbps * 1024) if self.warm_rate_kbps > 0 else None
+        )
         self._update_lock        = asyncio.Lock()
         self._scheduler_task: Optional[asyncio.Task] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._prefetched: Deque[Tuple[_PigImage, str]] = deque()
+        self._prefetch_task: Optional[asyncio.Task] = None
+        self._prefetch_fail_streak = 0
+        self._prefetch_paused_until = 0.0
+        self._convert_pool: Optional[concurrent.futures.Executor] = None
+        self._convert_slots = asyncio.Semaphore(self.convert_workers + self.convert_queue_size)
+
+        self._converted_cache: Optional[_DiskLRUCache] = None
+        self._local_cache: Optional[_DiskLRUCache] = None
+        if self.converted_cache_mb > 0:
+            cache = _DiskLRUCache(self._cache_dir, self.converted_cache_mb * 1024 * 1024)
+            try:
+                cache.load()
+                self._converted_cache = cache
+            except OSError as e:
+                logger.error(f"转换缓存目录初始化失败：{e}，已关闭转换缓存")
+
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._janitor_task: Optional[asyncio.Task] = None
+        self._tmp_files: Dict[str, float] = {}
+        self._pending_saves: Dict[str, asyncio.Task] = {}
+        self._tmp_refs: Dict[str, int] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._inflight_waiters: Dict[str, int] = {}
+        self._warm_task: Optional[asyncio.Task] = None
+        self._warm_progress: Dict[str, int] = {}
+        self._user_active = 0
+        self._user_idle = asyncio.Event()
+        self._user_idle.set()
 
         self._create_local_dir()
-        self._load_pig_from_json()
+        self._load_catalog()
+        self._load_fetch_meta()
 
     # ── 工具 ──────────────────────────────────────────────────────────────
 
@@ -94,12 +1343,37 @@ class PigRandomImagePlugin(Star):
         if not self.load_to_local:
             return
         try:
-            os.makedirs(self.local_img_dir, exist_ok=True)
-            logger.info(f"本地图片目录初始化完成：{self.local_img_dir}")
+            cache = _DiskLRUCache(
+                self.local_img_dir, self.local_cache_mb * 1024 * 1024, key_of=lambda fn: fn
+            )
+            cache.load()
+            self._local_cache = cache
+            logger.info(
+                f"本地图片目录初始化完成：{self.local_img_dir}"
+                f"（{len(cache)} 张，{cache.total_bytes / 1024 / 1024:.1f} MB）"
+            )
         except OSError as e:
             self.load_to_local = False
             logger.error(f"创建图片目录失败：{e}，已切换为仅网络加载")
 
+    def _gc_local_cache(self, removed: Optional[List[_PigImage]] = None):
+        """
+        清理本地缓存中已不在目录里的图片。传入 removed 时只淘汰这些条目对应的文件
+        （其中内容变化的条目会在下次请求时重新下载），否则与整个目录比对。
+        """
+        cache = self._local_cache
+        if cache is None:
+            return
+        if removed is not None:
+            stale = {img.filename for img in removed}
+        else:
+            valid = {img.filename for img in self.pig_images}
+            stale = {fn for fn in cache.keys() if fn not in valid}
+        for fn in stale:
+            cache.discard(fn)
+        if stale:
+            logger.info(f"本地缓存清理：移除 {len(stale)} 张已下架或已变化的图片")
+
     def _sanitize_filename(self, name: str, default: str = "image") -> str:
         if not name:
             name = default
@@ -135,198 +1409,313 @@ class PigRandomImagePlugin(Star):
         _, ext = os.path.splitext(filename)
         return ext.lower() if ext.lower() in _VALID_EXT else ".jpg"
 
-    # ── 图片格式转换 ───────────────────────────────────────────────────────
-    # QQ 官方机器人富媒体 API 仅支持 jpg / png / gif。
-    # 下载完成后统一用 Pillow 转换：
-    #   静态图（单帧）→ JPEG（更小体积，QQ 可靠支持）
-    #   动图（多帧）  → GIF（保留动画）
+    # ── HTTP 连接池 ───────────────────────────────────────────────────────
 
-    def _convert_image(self, src_path: str) -> Optional[str]:
+    def _get_session(self) -> aiohttp.ClientSession:
         """
-        将 src_path 指向的图片转换为 QQ 支持的格式后保存为新临时文件，
-        返回新文件路径；失败返回 None（调用方可继续尝试其他候选图）。
+        返回插件共用的 ClientSession；尚未创建或已被关闭时按配置重建。
+        超时按请求单独传入，不在 session 上设置。
         """
-        try:
-            from PIL import Image
-        except ImportError:
-            logger.error("[转换] Pillow 未安装，无法转换图片格式")
-            return None
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.http_pool_size,
+                limit_per_host=self.http_limit_per_host,
+                ttl_dns_cache=self.http_dns_cache_ttl or None,
+                use_dns_cache=self.http_dns_cache_ttl > 0,
+                keepalive_timeout=self.http_keepalive_timeout,
+            )
+            self._session = aiohttp.ClientSession(connector=connector, trust_env=True)
+        return self._session
 
-        try:
-            img = Image.open(src_path)
-        except Exception as e:
-            logger.warning("[转换] 无法打开图片：%s | %s", src_path, e)
-            return None
+    async def _close_session(self):
+        sess, self._session = self._session, None
+        if sess is not None and not sess.closed:
+            try:
+                await sess.close()
+            except Exception as e:
+                logger.debug("关闭 HTTP 会话出错：%s", e)
 
-        # 判断是否是动图（多帧）
-        is_animated = False
-        try:
-            n_frames = getattr(img, "n_frames", 1)
-            is_animated = n_frames > 1
-        except Exception:
-            is_animated = False
+    # ── 转换池 ─────────────────────────────────────────────────────────────
 
+    def _get_convert_pool(self) -> concurrent.futures.Executor:
+        if self._convert_pool is None:
+            if self.convert_pool_type == "process":
+                self._convert_pool = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.convert_workers
+                )
+            else:
+                self._convert_pool = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.convert_workers,
+                    thread_name_prefix="pig_convert",
+                )
+        return self._convert_pool
+
+    async def _convert_in_pool(self, src: Union[str, bytes],
+                               opts: Optional[_ConvertOptions] = None) -> Optional[str]:
+        """
+        在转换池中执行 _convert_image。池已满（运行 + 排队达到上限）时
+        最多等待 convert_wait_timeout 秒（0 为不等待），仍无空位则放弃本张图。
+        """
         try:
-            if is_animated:
-                return self._to_gif(img, src_path)
+            if not self._convert_slots.locked():
+                # 有空位时直接占用；wait_for 超时为 0 时会在 acquire 运行前就将其取消
+                await self._convert_slots.acquire()
             else:
-                return self._to_jpeg(img, src_path)
-        finally:
-            img.close()
-
-    def _to_jpeg(self, img, src_path: str) -> Optional[str]:
-        """静态图 → JPEG。"""
+                await asyncio.wait_for(self._convert_slots.acquire(), self.convert_wait_timeout)
+        except asyncio.TimeoutError:
+            logger.warning("[转换] 转换池繁忙，放弃本次转换")
+            self._metrics.incr("convert_busy")
+            return None
         try:
-            from PIL import Image
-            # RGBA / P 模式需先转 RGB，否则保存 JPEG 会报错
-            frame = img.convert("RGB") if img.mode not in ("RGB", "L") else img.copy()
-            dst = os.path.join(
-                self._tmp_dir,
-                f"pig_conv_{int(time.time())}_{random.randint(0, 10**9)}.jpg"
+            loop = asyncio.get_running_loop()
+            t0 = time.perf_counter()
+            fut = loop.run_in_executor(
+                self._get_convert_pool(), _convert_image, src, self._tmp_dir,
+                opts or self._convert_opts
             )
-            frame.save(dst, format="JPEG", quality=85, optimize=True)
-            frame.close()
-            logger.debug("[转换] %s → JPEG (%s)", os.path.basename(src_path), os.path.basename(dst))
-            return dst
         except Exception as e:
-            logger.warning("[转换] 转 JPEG 失败：%s | %s", src_path, e)
+            self._convert_slots.release()
+            logger.warning("[转换] 提交转换任务失败：%s | %s", type(e).__name__, e)
             return None
-
-    def _to_gif(self, img, src_path: str) -> Optional[str]:
-        """动图 → GIF（逐帧提取后合成）。"""
+        # 槽位在池中任务真正结束时才归还，调用方被取消也不会让池超额排队
+        fut.add_done_callback(lambda _f: self._convert_slots.release())
         try:
-            from PIL import Image
-            frames: List = []
-            durations: List[int] = []
-            try:
-                while True:
-                    frame = img.copy().convert("RGBA")
-                    # GIF 调色板最多 256 色，转 P 模式时用 LANCZOS
-                    frames.append(
-                        frame.convert("P", palette=Image.ADAPTIVE, colors=256)
-                    )
-                    dur = img.info.get("duration", 100)
-                    durations.append(max(20, int(dur)))  # 最低 20ms 防止过快
-                    img.seek(img.tell() + 1)
-            except EOFError:
-                pass
-
-            if not frames:
-                return None
-
-            dst = os.path.join(
-                self._tmp_dir,
-                f"pig_conv_{int(time.time())}_{random.randint(0, 10**9)}.gif"
-            )
-            frames[0].save(
-                dst,
-                format="GIF",
-                save_all=True,
-                append_images=frames[1:],
-                loop=0,
-                duration=durations,
-                optimize=False,
-            )
-            for f in frames:
-                f.close()
-            logger.debug(
-                "[转换] %s → GIF (%d 帧, %s)",
-                os.path.basename(src_path), len(frames), os.path.basename(dst)
-            )
-            return dst
+            converted = await asyncio.shield(fut)
+        except asyncio.CancelledError:
+            # 调用方已放弃，池中的转换无法中断：结束后直接删除其产物
+            fut.add_done_callback(self._discard_future_result)
+            raise
         except Exception as e:
-            logger.warning("[转换] 转 GIF 失败：%s | %s", src_path, e)
+            logger.warning("[转换] 转换任务异常：%s | %s", type(e).__name__, e)
             return None
+        if not _BACKGROUND_FETCH.get():
+            self._metrics.observe("convert", time.perf_counter() - t0)
+        if not converted:
+            self._metrics.incr("convert_failed")
+        self._track_temp(converted)
+        return converted
+
+    def _shutdown_convert_pool(self):
+        pool, self._convert_pool = self._convert_pool, None
+        if pool is not None:
+            try:
+                pool.shutdown(wait=False, cancel_futures=True)
+            except Exception as e:
+                logger.debug("关闭转换池出错：%s", e)
+
+    def _image_urls(self, selected_img: _PigImage) -> List[Tuple[Optional[_Mirror], str]]:
+        """按当前镜像健康度排序，返回该图在各镜像上的 (镜像, URL) 列表。"""
+        path = selected_img.get("path")
+        if not path:
+            url = selected_img.get("full_url", "")
+            return [(None, url)] if self._is_valid_url(url) else []
+        now = time.monotonic()
+        ordered = sorted(
+            self._mirrors,
+            key=lambda m: (not m.healthy(now), m.score() if m.healthy(now) else m.down_until),
+        )
+        return [(m, m.base + path) for m in ordered]
 
-    async def _download_image(self, url: str) -> Optional[str]:
+    async def _download_image(self, url: str, mirror: Optional[_Mirror] = None,
+                              opts: Optional[_ConvertOptions] = None,
+                              background: bool = False) -> Optional[str]:
         """
-        用 aiohttp 下载图片（30 秒超时），下载成功后自动转换格式：
-          静态图（单帧）→ JPEG  |  动图（多帧）→ GIF
+        用 aiohttp 分块下载图片（30 秒超时），下载成功后按 opts（默认全局配置）转换格式：
+          静态图（单帧）→ JPEG  |  动图（多帧）→ GIF  |  已符合要求 → 原样透传
+        不超过 inmemory_decode_kb 的图片直接在内存中交给 Pillow，
+        更大的图片边下载边写入 pig_raw_* 临时文件；超过 max_download_mb 立即中止。
+        background=True（预热）时按全局 warm_rate_kbps 限速：此时不设总超时，只限制
+        单次读取间隔（限速下大图本来就要下很久），超时与耗时也不计入镜像健康度。
         返回转换后的临时文件路径；失败返回 None。
         """
         if not self._is_valid_url(url):
             return None
-        timeout = aiohttp.ClientTimeout(total=30)
+        if background:
+            timeout = aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=30)
+        else:
+            timeout = aiohttp.ClientTimeout(total=30)
+        max_bytes = self.max_download_mb * 1024 * 1024
+        mem_limit = self.inmemory_decode_kb * 1024
+        limiter = self._warm_limiter if background else None
         raw_path = None
+        buf: Optional[bytearray] = bytearray()
+        f = None
+        completed = False
+        cancelled = False
+        started = time.monotonic()
         try:
-            async with aiohttp.ClientSession(timeout=timeout, trust_env=True) as sess:
-                async with sess.get(url, allow_redirects=True) as resp:
-                    ct = resp.headers.get("Content-Type", "")
-                    if resp.status != 200 or not ct.lower().startswith("image/"):
-                        try:
-                            preview = (await resp.text(errors="ignore"))[:200]
-                        except Exception:
-                            preview = ""
-                        logger.warning(
-                            "[下载] 非图片响应（%s，%s）：%s",
-                            resp.status, ct, preview
-                        )
-                        return None
-
-                    data = await resp.read()
-                    if not data:
-                        return None
-
-                    # 原始文件后缀，尽量保留给 Pillow 用于格式识别
-                    raw_ext = {
-                        "image/jpeg": ".jpg", "image/jpg": ".jpg",
-                        "image/png":  ".png", "image/gif": ".gif",
-                        "image/webp": ".webp", "image/bmp": ".bmp",
-                        "image/avif": ".avif",
-                    }.get(ct.split(";")[0].strip().lower(), ".bin")
-
-                    raw_path = os.path.join(
-                        self._tmp_dir,
-                        f"pig_raw_{int(time.time())}_{random.randint(0, 10**9)}{raw_ext}"
+            sess = self._get_session()
+            async with sess.get(url, allow_redirects=True, timeout=timeout) as resp:
+                ct = resp.headers.get("Content-Type", "")
+                if resp.status != 200 or not ct.lower().startswith("image/"):
+                    try:
+                        preview = (await resp.text(errors="ignore"))[:200]
+                    except Exception:
+                        preview = ""
+                    logger.warning(
+                        "[下载] 非图片响应（%s，%s）：%s",
+                        resp.status, ct, preview
                     )
-                    with open(raw_path, "wb") as f:
-                        f.write(data)
-
+                    if mirror:
+                        mirror.record(False)
+                    return None
+
+                if max_bytes and (resp.content_length or 0) > max_bytes:
+                    logger.warning("[下载] 图片过大（%d 字节），跳过：%s", resp.content_length, url[:80])
+                    return None
+
+                # 原始文件后缀，尽量保留给 Pillow 用于格式识别
+                raw_ext = {
+                    "image/jpeg": ".jpg", "image/jpg": ".jpg",
+                    "image/png":  ".png", "image/gif": ".gif",
+                    "image/webp": ".webp", "image/bmp": ".bmp",
+                    "image/avif": ".avif",
+                }.get(ct.split(";")[0].strip().lower(), ".bin")
+
+                received = 0
+                async for chunk in resp.content.iter_chunked(64 * 1024):
+                    received += len(chunk)
+                    if limiter is not None:
+                        await limiter.consume(len(chunk))
+                    if max_bytes and received > max_bytes:
+                        logger.warning("[下载] 图片超过 %d MB，已中止：%s", self.max_download_mb, url[:80])
+                        return None
+                    if f is not None:
+                        f.write(chunk)
+                        continue
+                    buf.extend(chunk)
+                    if len(buf) > mem_limit:
+                        # 超出内存解码阈值，转为边下边写临时文件
+                        raw_path = os.path.join(
+                            self._tmp_dir,
+                            f"pig_raw_{int(time.time())}_{random.randint(0, 10**9)}{raw_ext}"
+                        )
+                        f = open(raw_path, "wb")
+                        f.write(buf)
+                        buf = None
+
+                if not received:
+                    return None
+                completed = True
+                elapsed = time.monotonic() - started
+                if _BACKGROUND_FETCH.get():
+                    self._metrics.incr("background_download_bytes", received)
+                else:
+                    self._metrics.observe("network", elapsed)
+                    self._metrics.incr("download_bytes", received)
+                if mirror:
+                    # 限速下载的耗时反映的是限速而非镜像快慢，只记成功
+                    mirror.record(True, None if background else elapsed)
+
+        except asyncio.CancelledError:
+            # 对冲落败或无人等待而被取消，不算下载失败
+            cancelled = True
+            self._metrics.incr("download_cancelled")
+            raise
         except asyncio.TimeoutError:
             logger.warning("[下载] 超时（>30s）：%s", url[:80])
+            if mirror and not background:
+                mirror.record(False)
             return None
         except Exception as e:
             logger.debug("[下载] 异常：%s | %s", type(e).__name__, e)
+            if mirror:
+                mirror.record(False)
             return None
-
-        if not raw_path or not os.path.exists(raw_path):
-            return None
+        finally:
+            if f is not None:
+                f.close()
+            if not completed and not cancelled:
+                self._metrics.incr("download_failed")
+            if not completed and raw_path:
+                try:
+                    os.remove(raw_path)
+                except Exception:
+                    pass
 
         # 转换格式（静态→JPEG，动图→GIF），原始文件用完即删
         try:
-            converted = self._convert_image(raw_path)
+            converted = await self._convert_in_pool(bytes(buf) if buf is not None else raw_path, opts)
         finally:
-            try:
-                os.remove(raw_path)
-            except Exception:
-                pass
+            if raw_path:
+                try:
+                    os.remove(raw_path)
+                except Exception:
+                    pass
 
         if not converted:
             logger.warning("[下载] 格式转换失败，跳过此图：%s", url[:80])
         return converted
 
-    def _cleanup_tmp(self, max_age: int = 3600):
-        """清理超过 max_age 秒的临时下载文件。"""
+    # ── 临时文件 ───────────────────────────────────────────────────────────
+    # 转换产生的 pig_conv_* 在创建时登记到 _tmp_files；发送完成后立即删除，
+    # 移入缓存时注销。后台清理任务只遍历登记表，不再扫描目录。
+
+    def _track_temp(self, path: Optional[str]):
+        if path:
+            self._tmp_files[path] = time.time()
+
+    def _untrack_temp(self, path: Optional[str]):
+        if path:
+            self._tmp_files.pop(path, None)
+
+    def _release_temp(self, path: Optional[str]):
+        """
+        发送完成后释放临时文件：多个请求共享同一文件时，最后一个释放者才删除；
+        若后台仍在把它复制进本地缓存，则等复制结束再删。
+        """
+        if not path or path not in self._tmp_files:
+            return
+        refs = self._tmp_refs.pop(path, 1) - 1
+        if refs > 0:
+            self._tmp_refs[path] = refs
+            return
+        saving = self._pending_saves.get(path)
+        if saving is not None and not saving.done():
+            saving.add_done_callback(lambda _t: self._discard_temp(path))
+        else:
+            self._discard_temp(path)
+
+    def _sweep_tmp(self, max_age: float):
+        now = time.time()
+        expired = [p for p, ts in self._tmp_files.items() if now - ts > max_age]
+        for p in expired:
+            self._discard_temp(p)
+        if expired:
+            logger.debug("临时文件清理：%d 个", len(expired))
+
+    def _adopt_leftover_tmp(self):
+        """启动时登记上次运行遗留的临时文件（唯一一次目录扫描），交给清理任务按时删除。"""
         try:
-            now = time.time()
-            for fn in os.listdir(self._tmp_dir):
-                if not fn.startswith("pig_"):
-                    continue
-                fp = os.path.join(self._tmp_dir, fn)
-                try:
-                    if now - os.path.getmtime(fp) > max_age:
-                        os.remove(fp)
-                except Exception:
-                    pass
-        except Exception:
+            with os.scandir(self._tmp_dir) as it:
+                for de in it:
+                    if de.name.startswith("pig_") and de.is_file():
+                        try:
+                            self._tmp_files[de.path] = de.stat().st_mtime
+                        except OSError:
+                            pass
+        except OSError:
+            pass
+
+    async def _tmp_janitor_task(self):
+        try:
+            self._adopt_leftover_tmp()
+            while True:
+                self._sweep_tmp(self.tmp_max_age)
+                await asyncio.sleep(self.tmp_janitor_interval)
+        except asyncio.CancelledError:
             pass
+        except Exception as e:
+            logger.error(f"临时文件清理任务出错：{e}")
 
     def _clean_text(self, text: str) -> str:
         if not isinstance(text, str):
             return ""
-        text = re.sub(r"\[At:[^\]]+\]", "", text)
-        text = re.sub(r"<at[^>]*>.*?</at>", "", text, flags=re.I | re.S)
-        return re.sub(r"\s+", " ", text.strip().lstrip("/\\／﹨")).strip()
+        if "[At:" in text:
+            text = _AT_TAG_RE.sub("", text)
+        if "<" in text:
+            text = _AT_XML_RE.sub("", text)
+        return _SPACES_RE.sub(" ", text.strip().lstrip("/\\／﹨")).strip()
 
     def _build_full_url(self, image_url: str) -> Optional[str]:
         """
@@ -341,23 +1730,161 @@ class PigRandomImagePlugin(Star):
         else:
             raw = PIGHUB_BASE + "/" + image_url.lstrip("/")
         try:
-            p = urllib.parse.urlparse(raw)
-            encoded = urllib.parse.urlunparse(
-                (p.scheme, p.netloc, self._quote_path(p.path),
-                 p.params, p.query, p.fragment)
-            )
-            return encoded
-        except Exception:
+            p = urllib.parse.urlparse(raw)
+            encoded = urllib.parse.urlunparse(
+                (p.scheme, p.netloc, self._quote_path(p.path),
+                 p.params, p.query, p.fragment)
+            )
+            return encoded
+        except Exception:
+            return None
+
+    # ── JSON 加载 ──────────────────────────────────────────────────────────
+    # list.json 格式：{"images": [{"id", "title", "filename", "image_url", ...}, ...]}
+    # 与 pighub API 的 data 数组格式完全一致，直接存储 data 数组即可。
+
+    @staticmethod
+    def _catalog_key(img: dict) -> str:
+        """目录条目的唯一键：优先 id，缺失时退化为文件名 / image_url。"""
+        ident = img.get("id")
+        if ident is not None:
+            return str(ident)
+        return "f:" + str(img.get("filename") or img.get("image_url") or "")
+
+    @staticmethod
+    def _catalog_sig(img: dict) -> Tuple[Any, Any]:
+        """判断图片内容是否变化的签名；标题等元数据变化原地更新，不算图片变化。"""
+        return img.get("mtime"), img.get("filename") or img.get("image_url")
+
+    @staticmethod
+    def _popularity(img: dict) -> int:
+        try:
+            return int(img.get("view_count") or 0) + int(img.get("download_count") or 0)
+        except (TypeError, ValueError):
+            return 0
+
+    def _on_catalog_changed(self, added: Optional[List[_PigImage]] = None,
+                            removed: Optional[List[_PigImage]] = None):
+        """
+        目录内容变化后更新依赖目录的派生结构。
+        传入 added / removed 时标题索引增量更新，否则整体重建。
+        """
+        self._selector.rebuild(self.pig_images)
+        if added is None and removed is None:
+            self._title_index.rebuild(self.pig_images)
+            if self.pig_images:
+                self._gc_local_cache()
+            return
+        self._gc_local_cache(removed or [])
+        for img in removed or ():
+            self._title_index.remove(img)
+        for img in added or ():
+            self._title_index.add(img)
+
+    def _make_entry(self, img: dict) -> Optional[_PigImage]:
+        """把 list.json / API 的原始条目转换为内部目录条目；无效条目返回 None。"""
+        # 文件名：优先 filename 字段，否则从 image_url 路径推断
+        image_url_field = img.get("image_url", "")
+        filename = img.get("filename") or os.path.basename(image_url_field)
+        filename = self._sanitize_filename(str(filename))
+        if not filename:
+            logger.warning(f"跳过无效条目：{img.get('title', '未知')}")
+            return None
+        if not self._is_valid_img_suffix(filename):
+            filename += ".jpg"
+
+        # 图片下载走镜像源（pighub 直链被 WAF 拦截，API 列表接口不受影响）；
+        # full_url 为首选镜像地址，实际下载时按镜像健康度重新拼接
+        image_type = img.get("image_type")
+        animated = image_type == "animated" if image_type else filename.lower().endswith(".gif")
+        return _PigImage(
+            img.get("title", "随机猪图"), filename,
+            img.get("id"), img.get("mtime"), self._mirrors[0].base,
+            popularity=self._popularity(img), animated=animated,
+        )
+
+    # ── 目录快照 ───────────────────────────────────────────────────────────
+    # list_snapshot.pkl 保存已派生好的目录条目，以 list.json 内容哈希校验；
+    # 命中时启动无需解析 JSON、清洗文件名与 URL 编码。
+
+    _SNAPSHOT_VERSION = 4
+
+    def _json_digest(self) -> Optional[str]:
+        try:
+            with open(self.json_path, "rb") as f:
+                return hashlib.sha1(f.read()).hexdigest()
+        except OSError:
             return None
 
-    # ── JSON 加载 ──────────────────────────────────────────────────────────
-    # list.json 格式：{"images": [{"id", "title", "filename", "image_url", ...}, ...]}
-    # 与 pighub API 的 data 数组格式完全一致，直接存储 data 数组即可。
+    def _load_catalog(self):
+        digest = self._json_digest()
+        if digest is None:
+            self._load_pig_from_json()
+            return
+        if self._load_snapshot(digest):
+            return
+        self._load_pig_from_json()
+        self._save_snapshot(digest)
+
+    def _load_snapshot(self, digest: str) -> bool:
+        try:
+            with open(self._snapshot_path, "rb") as f:
+                snap = pickle.load(f)
+        except Exception:
+            return False
+        if (
+            not isinstance(snap, dict)
+            or snap.get("version") != self._SNAPSHOT_VERSION
+            or snap.get("digest") != digest
+        ):
+            return False
+        try:
+            base = self._mirrors[0].base
+            images: List[_PigImage] = []
+            entries: Dict[str, Tuple[Tuple[Any, Any], _PigImage]] = {}
+            for key, sig, title, filename, ident, mtime, popularity, animated in snap["rows"]:
+                entry = _PigImage(title, filename, ident, mtime, base, popularity, animated)
+                images.append(entry)
+                entries[key] = (sig, entry)
+        except Exception as e:
+            logger.debug("目录快照损坏，改为解析 list.json：%s", e)
+            return False
+        self.pig_images = images
+        self._catalog_entries = entries
+        self._on_catalog_changed()
+        logger.info(f"图片配置加载成功（快照），共 {len(self.pig_images)} 张")
+        return True
+
+    def _save_snapshot(self, digest: Optional[str]):
+        if not digest:
+            return
+        rows = [
+            (key, sig, e.title, e.filename, e.id, e.mtime, e.popularity, e.animated)
+            for key, (sig, e) in self._catalog_entries.items()
+        ]
+        snap = {
+            "version": self._SNAPSHOT_VERSION,
+            "digest":  digest,
+            "rows":    rows,
+        }
+        tmp = f"{self._snapshot_path}.tmp_{int(time.time())}_{random.randint(0, 10**9)}"
+        try:
+            with open(tmp, "wb") as f:
+                pickle.dump(snap, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self._snapshot_path)
+        except Exception as e:
+            logger.debug("保存目录快照失败：%s", e)
+            try:
+                os.path.exists(tmp) and os.remove(tmp)
+            except Exception:
+                pass
 
     def _load_pig_from_json(self):
         if not os.path.exists(self.json_path):
             logger.info("list.json 不存在，跳过本地加载")
             self.pig_images = []
+            self._catalog_entries = {}
+            self._on_catalog_changed()
             return
         try:
             with open(self.json_path, "r", encoding="utf-8") as f:
@@ -365,70 +1892,99 @@ class PigRandomImagePlugin(Star):
         except Exception as e:
             logger.error(f"加载 list.json 失败：{e}")
             self.pig_images = []
+            self._catalog_entries = {}
+            self._on_catalog_changed()
             return
 
         raw_images = json_data.get("images", []) if isinstance(json_data, dict) else []
         self.pig_images.clear()
+        self._catalog_entries = {}
         for img in raw_images:
             if not isinstance(img, dict):
                 continue
-
-            # 文件名：优先 filename 字段，否则从 image_url 路径推断
-            image_url_field = img.get("image_url", "")
-            filename = img.get("filename") or os.path.basename(image_url_field)
-            filename = self._sanitize_filename(str(filename))
-            if not filename:
-                logger.warning(f"跳过无效条目：{img.get('title', '未知')}")
+            entry = self._make_entry(img)
+            if entry is None:
                 continue
-            if not self._is_valid_img_suffix(filename):
-                filename += ".jpg"
-
-            # 图片下载走 GitHub raw（pighub 直链被 WAF 拦截，API 列表接口不受影响）
-            encoded_filename = urllib.parse.quote(filename, safe="")
-            full_url = GHRAW_BASE + encoded_filename
-
-            self.pig_images.append({
-                "title":    img.get("title", "随机猪图"),
-                "full_url": full_url,
-                "filename": filename,
-                "id":       img.get("id"),
-            })
+            self.pig_images.append(entry)
+            self._catalog_entries[self._catalog_key(img)] = (self._catalog_sig(img), entry)
 
+        self._on_catalog_changed()
         logger.info(f"图片配置加载成功，共 {len(self.pig_images)} 张")
 
     # ── 远程拉取 & 更新 ────────────────────────────────────────────────────
 
+    def _load_fetch_meta(self):
+        try:
+            with open(self._fetch_meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if isinstance(meta, dict):
+                self._fetch_meta = {k: str(v) for k, v in meta.items() if k in ("etag", "last_modified")}
+        except Exception:
+            self._fetch_meta = {}
+
+    def _save_fetch_meta(self, etag: Optional[str], last_modified: Optional[str]):
+        meta = {}
+        if etag:
+            meta["etag"] = etag
+        if last_modified:
+            meta["last_modified"] = last_modified
+        self._fetch_meta = meta
+        try:
+            with open(self._fetch_meta_path, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+        except Exception as e:
+            logger.debug("保存远程列表校验信息失败：%s", e)
+
+    def _commit_fetch_meta(self):
+        pending, self._pending_fetch_meta = self._pending_fetch_meta, None
+        if pending is not None:
+            self._save_fetch_meta(*pending)
+
     async def _fetch_remote_images(self) -> Optional[dict]:
         """
         请求 pighub API，返回标准化后的 {"images": [...]} 结构；
-        失败返回 None。
+        远程未变化（304）时返回 {"not_modified": True}；失败返回 None。
 
         API 响应结构：
           {"code": 0, "message": "OK", "data": [{id, title, filename, image_url, ...}]}
+
+        请求带 ETag / Last-Modified 条件头（仅在本地目录已加载时），并声明支持压缩编码。
         """
+        headers = {"Accept-Encoding": _ACCEPT_ENCODING}
+        if self.pig_images:
+            if self._fetch_meta.get("etag"):
+                headers["If-None-Match"] = self._fetch_meta["etag"]
+            if self._fetch_meta.get("last_modified"):
+                headers["If-Modified-Since"] = self._fetch_meta["last_modified"]
         try:
             timeout = aiohttp.ClientTimeout(total=15)
-            async with aiohttp.ClientSession(
-                timeout=timeout, trust_env=True
-            ) as sess:
-                async with sess.get(PIGHUB_API) as resp:
-                    if resp.status != 200:
-                        logger.error(f"远程请求失败，状态码：{resp.status}")
-                        return None
-                    payload = await resp.json(content_type=None)
+            sess = self._get_session()
+            async with sess.get(PIGHUB_API, timeout=timeout, headers=headers) as resp:
+                if resp.status == 304:
+                    logger.info("远程列表未变化（304）")
+                    return {"not_modified": True}
+                if resp.status != 200:
+                    logger.error(f"远程请求失败，状态码：{resp.status}")
+                    return None
+                text = await resp.text(encoding="utf-8")
+                etag = resp.headers.get("ETag")
+                last_modified = resp.headers.get("Last-Modified")
 
-            if not isinstance(payload, dict):
-                logger.error("远程响应非 JSON 对象")
+            try:
+                code, message, data = _parse_api_payload(text)
+            except ValueError as e:
+                logger.error(f"远程响应非 JSON 对象：{e}")
                 return None
-            if payload.get("code") != 0:
-                logger.error(f"远程接口返回错误：code={payload.get('code')}, message={payload.get('message')}")
+            if code != 0:
+                logger.error(f"远程接口返回错误：code={code}, message={message}")
                 return None
-            data = payload.get("data")
-            if not isinstance(data, list) or not data:
+            if not data:
                 logger.error("远程接口 data 字段为空或格式错误")
                 return None
 
             logger.info(f"远程接口返回 {len(data)} 张图片")
+            # 校验信息在数据成功应用后才落盘，避免写 list.json 失败后一直收到 304
+            self._pending_fetch_meta = (etag, last_modified)
             return {"images": data}
 
         except asyncio.TimeoutError:
@@ -439,45 +1995,72 @@ class PigRandomImagePlugin(Star):
             return None
 
     def _apply_remote_data_if_needed(self, remote_data: dict) -> bool:
-        if not isinstance(remote_data, dict):
+        """
+        按 id + 签名（mtime / 文件名）对比远程数据与内存目录，
+        只为新增和变化的条目重建内部结构，未变化的条目直接复用（热度、标题原地更新）；
+        被删除或变化的图片从转换缓存中淘汰。有变化时以紧凑 JSON 写回 list.json。
+        """
+        if not isinstance(remote_data, dict) or remote_data.get("not_modified"):
             return False
         remote_images = remote_data.get("images")
         if not isinstance(remote_images, list) or not remote_images:
             logger.error("远程数据无效，拒绝更新")
             return False
 
-        local_data = None
-        if os.path.exists(self.json_path):
-            try:
-                with open(self.json_path, "r", encoding="utf-8") as f:
-                    local_data = json.load(f)
-            except Exception:
-                local_data = None
-
-        def extract_ids(d):
-            if not isinstance(d, dict):
-                return set()
-            imgs = d.get("images") or []
-            return {i.get("id") for i in imgs if isinstance(i, dict) and "id" in i}
-
-        local_ids  = extract_ids(local_data)
-        remote_ids = extract_ids(remote_data)
-        need_update = (
-            not local_data
-            or local_ids != remote_ids
-            or len((local_data or {}).get("images", [])) != len(remote_images)
-        )
-        if not need_update:
+        old_entries = self._catalog_entries
+        new_entries: Dict[str, Tuple[Tuple[Any, Any], _PigImage]] = {}
+        new_images: List[_PigImage] = []
+        added = changed = 0
+        stats_changed = False
+        retitled: List[Tuple[_PigImage, Any]] = []
+        fresh: List[_PigImage] = []
+        for img in remote_images:
+            if not isinstance(img, dict):
+                continue
+            key = self._catalog_key(img)
+            if key in new_entries:
+                continue
+            sig = self._catalog_sig(img)
+            old = old_entries.get(key)
+            if old is not None and old[0] == sig:
+                # 图片未变，仅刷新热度、标题等元数据字段
+                entry = old[1]
+                popularity = self._popularity(img)
+                if entry.popularity != popularity:
+                    entry.popularity = popularity
+                    stats_changed = True
+                title = img.get("title", "随机猪图")
+                if title != entry.title:
+                    # 标题变化待 list.json 落盘后再改，以便同步更新标题索引
+                    retitled.append((entry, title))
+            else:
+                entry = self._make_entry(img)
+                if entry is None:
+                    continue
+                fresh.append(entry)
+                if old is None:
+                    added += 1
+                else:
+                    changed += 1
+            new_entries[key] = (sig, entry)
+            new_images.append(entry)
+
+        stale = [old_entries[k][1] for k in old_entries.keys() - new_entries.keys()]
+        stale += [
+            old[1] for k, old in old_entries.items()
+            if k in new_entries and new_entries[k][1] is not old[1]
+        ]
+        removed = len(stale) - changed
+        if not (added or changed or removed or stats_changed or retitled) and os.path.exists(self.json_path):
+            self._commit_fetch_meta()
             return False
 
         tmp = f"{self.json_path}.tmp_{int(time.time())}_{random.randint(0, 10**9)}"
         try:
-            with open(tmp, "w", encoding="utf-8") as f:
-                json.dump(remote_data, f, ensure_ascii=False, indent=2)
+            payload = json.dumps(remote_data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            with open(tmp, "wb") as f:
+                f.write(payload)
             os.replace(tmp, self.json_path)
-            logger.info("list.json 已更新（远程变化）")
-            self._load_pig_from_json()
-            return True
         except Exception as e:
             logger.error(f"保存 list.json 失败：{e}")
             try:
@@ -486,16 +2069,47 @@ class PigRandomImagePlugin(Star):
                 pass
             return False
 
+        self.pig_images = new_images
+        self._catalog_entries = new_entries
+        self._commit_fetch_meta()
+        for entry, title in retitled:
+            self._title_index.remove(entry)
+            entry.title = sys.intern(title) if isinstance(title, str) else title
+            self._title_index.add(entry)
+        self._on_catalog_changed(added=fresh, removed=stale)
+        self._save_snapshot(hashlib.sha1(payload).hexdigest())
+        if self._converted_cache is not None:
+            for entry in stale:
+                for profile in ("", *self._profiles):
+                    self._converted_cache.discard(self._cache_key(entry, profile))
+        logger.info(
+            f"list.json 已更新（远程变化）：新增 {added}，变化 {changed}，删除 {removed}，"
+            f"改标题 {len(retitled)}"
+        )
+        return True
+
     # ── 初始化 ─────────────────────────────────────────────────────────────
 
+    async def _initial_refresh(self):
+        """启动后的首次远程刷新，在后台执行，不阻塞插件就绪。"""
+        try:
+            async with self._update_lock:
+                remote_data = await self._fetch_remote_images()
+                if remote_data:
+                    updated = self._apply_remote_data_if_needed(remote_data)
+                    logger.info("初始化：" + ("已从远程更新本地列表" if updated else "本地列表已是最新"))
+            self._schedule_prefetch()
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"处理远程数据时出错：{e}")
+
     async def initialize(self):
-        remote_data = await self._fetch_remote_images()
-        if remote_data:
-            try:
-                updated = self._apply_remote_data_if_needed(remote_data)
-                logger.info("初始化：" + ("已从远程更新本地列表" if updated else "本地列表已是最新"))
-            except Exception as e:
-                logger.error(f"处理远程数据时出错：{e}")
+        self._get_session()
+        self._janitor_task = asyncio.create_task(self._tmp_janitor_task())
+        if self.metrics_file:
+            self._metrics_task = asyncio.create_task(self._metrics_dump_task())
+        self._refresh_task = asyncio.create_task(self._initial_refresh())
 
         if self.update_cycle > 0:
             if self._scheduler_task and not self._scheduler_task.done():
@@ -505,6 +2119,15 @@ class PigRandomImagePlugin(Star):
         else:
             logger.info("未启用后台自动更新（update_cycle=0）")
 
+        self._schedule_prefetch()
+
+        state = self._load_warm_state()
+        if state.get("pending"):
+            logger.info("检测到未完成的预热，继续执行")
+            self._start_warm(int(state.get("top_n") or 0))
+        elif self.warm_on_startup:
+            self._start_warm(self.warm_top_n)
+
         logger.info(
             f"猪图插件 v0.1.6 初始化完成 | "
             f"冷却 {self.cooldown_period}s | 本地缓存 {self.load_to_local} | "
@@ -513,11 +2136,28 @@ class PigRandomImagePlugin(Star):
 
     # ── 下载与缓存 ─────────────────────────────────────────────────────────
 
+    def _cooldown_key(self, event: AstrMessageEvent) -> str:
+        if self.cooldown_scope == "global":
+            return "pig"
+        try:
+            group_id = str(event.get_group_id() or "")
+        except Exception:
+            group_id = ""
+        try:
+            user_id = str(event.get_sender_id() or "")
+        except Exception:
+            user_id = ""
+        if self.cooldown_scope == "group":
+            # 私聊没有群号，退化为按用户冷却
+            return f"g:{group_id}" if group_id else f"u:{user_id}"
+        if self.cooldown_scope == "user":
+            return f"u:{user_id}"
+        return f"g:{group_id}|u:{user_id}"
+
     def _is_on_cooldown(self, key: str) -> Tuple[bool, float]:
-        elapsed = time.time() - self.last_called_times.get(key, 0)
-        return elapsed < self.cooldown_period, max(0.0, self.cooldown_period - elapsed)
+        return self._cooldown.check(key)
 
-    async def _get_local_image(self, selected_img: dict) -> Optional[str]:
+    async def _get_local_image(self, selected_img: _PigImage, background: bool = False) -> Optional[str]:
         img_filename = selected_img.get("filename")
         if not img_filename:
             return None
@@ -528,17 +2168,34 @@ class PigRandomImagePlugin(Star):
             logger.warning("可疑路径，拒绝：%s", local_abs)
             return None
 
-        if os.path.exists(local_abs) and self._is_valid_img_suffix(local_abs):
-            logger.info(f"使用本地缓存：{img_filename}")
-            return local_abs
+        cache = self._local_cache
+        if cache is None:
+            return None
+        if self._is_valid_img_suffix(img_filename):
+            t0 = time.perf_counter()
+            cached = cache.get(img_filename)
+            if not _BACKGROUND_FETCH.get():
+                self._metrics.observe("cache", time.perf_counter() - t0)
+            if cached:
+                logger.debug("使用本地缓存：%s", img_filename)
+                return cached
+
+        return await self._single_flight(
+            "local:" + selected_img.uid,
+            lambda: self._download_to_local(selected_img, img_filename, background),
+        )
 
-        logger.info(f"本地缺失，开始下载：{img_filename}")
-        url = selected_img.get("full_url", "")
-        if not self._is_valid_url(url):
+    async def _download_to_local(self, selected_img: _PigImage, img_filename: str,
+                                 background: bool = False) -> Optional[str]:
+        cache = self._local_cache
+        logger.debug("本地缺失，开始下载：%s", img_filename)
+        urls = self._image_urls(selected_img)
+        if not urls:
             return None
+        mirror, url = urls[0]
 
-        async with self._download_semaphore:
-            temp_path = await self._download_image(url)
+        async with (self._warm_semaphore if background else self._download_semaphore):
+            temp_path = await self._download_image(url, mirror, background=background)
 
         if not temp_path or not self._is_valid_img_suffix(os.path.basename(temp_path)):
             if temp_path:
@@ -550,57 +2207,496 @@ class PigRandomImagePlugin(Star):
             return None
 
         try:
-            os.makedirs(self.local_img_dir, exist_ok=True)
-            td = os.path.join(self.local_img_dir,
-                              f".tmp_{int(time.time())}_{random.randint(0, 10**9)}")
-            shutil.copy2(temp_path, td)
-            os.replace(td, local_abs)
-            logger.info(f"已缓存到本地：{local_abs}")
+            t0 = time.perf_counter()
+            local_abs = cache.put(img_filename, temp_path, filename=img_filename)
+            if not _BACKGROUND_FETCH.get():
+                self._metrics.observe("local_save", time.perf_counter() - t0)
+            self._untrack_temp(temp_path)
+            logger.debug("已缓存到本地：%s", local_abs)
             return local_abs
         except Exception as e:
             logger.error(f"保存本地失败：{e}")
             return temp_path if os.path.exists(temp_path) else None
 
-    async def _download_with_retries(self, url: str, title: str) -> Optional[str]:
-        if not self._is_valid_url(url):
-            logger.warning("无效 URL：%s", url)
+    async def _download_with_retries(self, selected_img: _PigImage,
+                                     opts: Optional[_ConvertOptions] = None,
+                                     background: bool = False) -> Optional[str]:
+        title = selected_img.get("title", "随机猪图")
+        urls = self._image_urls(selected_img)
+        if not urls:
+            logger.warning("无效 URL：%s", selected_img.get("full_url", ""))
             return None
 
+        # 每次重试换到下一个镜像；所有镜像都轮过一遍后才退避等待
         for attempt in range(1, max(1, self.max_retries) + 1):
-            async with self._download_semaphore:
-                logger.info(f"[下载] 尝试 {attempt}/{self.max_retries}：{title}")
-                temp_path = await self._download_image(url)
+            mirror, url = urls[(attempt - 1) % len(urls)]
+            async with (self._warm_semaphore if background else self._download_semaphore):
+                logger.debug("[下载] 尝试 %d/%d：%s", attempt, self.max_retries, title)
+                temp_path = await self._download_image(url, mirror, opts, background)
                 if temp_path:
                     return temp_path
-            if attempt < max(1, self.max_retries):
+            if attempt < max(1, self.max_retries) and attempt % len(urls) == 0:
                 await asyncio.sleep(min(2.0, 1.5 ** attempt))
 
         logger.error(f"[下载] 获取 {title} 失败（共 {self.max_retries} 次）")
         return None
 
+    def _cache_key(self, selected_img: _PigImage, profile: str = "") -> str:
+        """
+        转换缓存键：图片 id + 文件名 + mtime（源图变化后自然失效），
+        非默认转换配置档再加上配置档名，各平台的转换结果分别缓存。
+        """
+        raw = f"{selected_img.get('id')}|{selected_img.get('filename')}|{selected_img.get('mtime')}"
+        if profile:
+            raw += f"|{profile}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def _output_profile(self, event: AstrMessageEvent) -> str:
+        """消息来源平台对应的转换配置档名；未单独配置的平台返回 ""（默认配置档）。"""
+        try:
+            name = str(event.get_platform_name() or "").lower()
+        except Exception:
+            return ""
+        return name if name in self._profiles else ""
+
+    async def _get_converted_image(self, selected_img: _PigImage, profile: str = "",
+                                   background: bool = False) -> Optional[str]:
+        """
+        优先从转换缓存取图（命中则跳过网络与 Pillow）；
+        未命中时按 profile 对应的配置档下载并转换，结果移入缓存后返回缓存内路径。
+        """
+        cache = self._converted_cache
+        key = self._cache_key(selected_img, profile) if cache is not None else ""
+        if cache is not None:
+            t0 = time.perf_counter()
+            cached = cache.get(key)
+            if not _BACKGROUND_FETCH.get():
+                self._metrics.observe("cache", time.perf_counter() - t0)
+            if cached:
+                return cached
+
+        return await self._single_flight(
+            f"conv:{selected_img.uid}|{profile}",
+            lambda: self._download_to_converted_cache(selected_img, key, profile, background),
+        )
+
+    async def _download_to_converted_cache(self, selected_img: _PigImage, key: str,
+                                           profile: str = "",
+                                           background: bool = False) -> Optional[str]:
+        cache = self._converted_cache
+        temp_path = await self._download_with_retries(
+            selected_img, self._profiles.get(profile) if profile else None, background
+        )
+        if not temp_path or cache is None:
+            return temp_path
+        try:
+            cached = cache.put(key, temp_path)
+            self._untrack_temp(temp_path)
+            return cached
+        except OSError as e:
+            logger.debug("写入转换缓存失败：%s", e)
+            return temp_path if os.path.exists(temp_path) else None
+
+    async def _single_flight(self, key: str,
+                             factory: Callable[[], Awaitable[Optional[str]]]) -> Optional[str]:
+        """
+        同一 key 的并发请求只执行一次 factory，其余调用方等待同一结果。
+        实际工作放在独立 task 中并用 shield 等待，个别调用方被取消不会中断其他人；
+        最后一个等待者也离开时取消该 task（例如对冲下载中落败的候选）。
+        结果为临时文件时，task 结束的瞬间按仍在等待的调用方数一次性计入引用，
+        不会出现先拿到结果的调用方发送完就删掉、后面的调用方还没来得及计数的情况。
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(factory())
+            self._inflight[key] = task
+            self._inflight_waiters[key] = 0
+            task.add_done_callback(lambda t: self._on_flight_done(key, t))
+        self._inflight_waiters[key] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if task.done():
+                # 结果已按本调用方计过引用，这里归还
+                if not task.cancelled() and task.exception() is None:
+                    self._release_temp(task.result())
+            else:
+                self._inflight_waiters[key] -= 1
+                if self._inflight_waiters[key] <= 0:
+                    self._inflight.pop(key, None)
+                    self._inflight_waiters.pop(key, None)
+                    task.cancel()
+            raise
+
+    def _on_flight_done(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is not task:
+            return
+        del self._inflight[key]
+        waiters = self._inflight_waiters.pop(key, 0)
+        if task.cancelled() or task.exception() is not None:
+            return
+        result = task.result()
+        if result and result in self._tmp_files and waiters > 0:
+            self._tmp_refs[result] = self._tmp_refs.get(result, 0) + waiters
+
     async def _save_to_local_cache_async(self, downloaded_path: str, target_filename: str):
-        if not downloaded_path:
+        if not downloaded_path or self._local_cache is None:
             return
         try:
             if not target_filename:
                 target_filename = os.path.basename(downloaded_path)
             safe = self._sanitize_filename(str(target_filename))
-            os.makedirs(self.local_img_dir, exist_ok=True)
-            dest = os.path.join(self.local_img_dir, safe)
-            td   = os.path.join(self.local_img_dir,
-                                 f".tmp_{int(time.time())}_{random.randint(0, 10**9)}")
-            shutil.copy2(downloaded_path, td)
-            os.replace(td, dest)
-            logger.info("后台缓存完成：%s", dest)
+            t0 = time.perf_counter()
+            dest = self._local_cache.put(safe, downloaded_path, filename=safe, copy=True)
+            if not _BACKGROUND_FETCH.get():
+                self._metrics.observe("local_save", time.perf_counter() - t0)
+            logger.debug("后台缓存完成：%s", dest)
         except Exception as e:
             logger.debug("后台缓存失败：%s", e)
 
+    # ── 预取 ───────────────────────────────────────────────────────────────
+    # 连续 _PREFETCH_MAX_FAILS 轮全部失败后暂停 _PREFETCH_PAUSE 秒，避免源站故障时空转
+
+    _PREFETCH_MAX_FAILS = 3
+    _PREFETCH_PAUSE     = 300
+
+    def _schedule_prefetch(self):
+        if self.prefetch_depth <= 0 or not self.pig_images:
+            return
+        if len(self._prefetched) >= self.prefetch_depth:
+            return
+        if time.time() < self._prefetch_paused_until:
+            return
+        if self._prefetch_task and not self._prefetch_task.done():
+            return
+        self._prefetch_task = asyncio.create_task(self._prefetch_fill())
+
+    async def _prefetch_one(self) -> Optional[Tuple[_PigImage, str]]:
+        if not self.pig_images:
+            return None
+        selected_img = self._selector.draw(self.select_strategy, self.select_filter)
+        if selected_img is None:
+            return None
+        try:
+            path = await self._get_converted_image(selected_img)
+        except Exception as e:
+            logger.debug("预取出错：%s", e)
+            return None
+        return (selected_img, path) if path else None
+
+    async def _prefetch_fill(self):
+        _BACKGROUND_FETCH.set(True)
+        try:
+            while self.pig_images and len(self._prefetched) < self.prefetch_depth:
+                n = min(self.prefetch_concurrency, self.prefetch_depth - len(self._prefetched))
+                results = await asyncio.gather(*(self._prefetch_one() for _ in range(n)))
+                ok = [r for r in results if r]
+                self._prefetched.extend(ok)
+                if ok:
+                    self._prefetch_fail_streak = 0
+                    continue
+                self._prefetch_fail_streak += 1
+                if self._prefetch_fail_streak >= self._PREFETCH_MAX_FAILS:
+                    self._prefetch_paused_until = time.time() + self._PREFETCH_PAUSE
+                    self._prefetch_fail_streak = 0
+                    logger.warning("预取连续失败，暂停 %d 秒", self._PREFETCH_PAUSE)
+                    break
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"预取任务出错：{e}")
+
+    def _pop_prefetched(self) -> Optional[Tuple[_PigImage, str]]:
+        while self._prefetched:
+            selected_img, path = self._prefetched.popleft()
+            if os.path.exists(path):
+                return selected_img, path
+        return None
+
+    async def _cancel_prefetch(self):
+        task, self._prefetch_task = self._prefetch_task, None
+        if task and not task.done():
+            task.cancel()
+            try:
+                await asyncio.wait_for(task, timeout=5)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                pass
+        self._prefetched.clear()
+
+    # ── 候选图获取 ─────────────────────────────────────────────────────────
+
+    async def _fetch_candidate(self, selected_img: _PigImage, profile: str = "") -> Optional[str]:
+        """
+        获取单张候选图：本地优先（若开启），否则走转换缓存 / 网络。
+        本地图库只保存默认配置档的结果，其他配置档直接走转换缓存。
+        """
+        if self.load_to_local and not profile:
+            try:
+                img_path = await self._get_local_image(selected_img)
+                if img_path:
+                    return img_path
+                logger.debug("本地加载失败，切换为网络加载")
+            except Exception as e:
+                logger.error(f"本地加载出错：{e}")
+
+        temp_path = await self._get_converted_image(selected_img, profile)
+        if temp_path and self.load_to_local and not profile:
+            task = asyncio.create_task(
+                self._save_to_local_cache_async(temp_path, selected_img.get("filename"))
+            )
+            if temp_path in self._tmp_files:
+                self._pending_saves[temp_path] = task
+                task.add_done_callback(lambda _t: self._pending_saves.pop(temp_path, None))
+        return temp_path
+
+    def _discard_temp(self, path: Optional[str]):
+        """删除 imgs/tmp 下的临时结果；缓存目录中的文件保留。"""
+        if not path:
+            return
+        self._tmp_files.pop(path, None)
+        self._tmp_refs.pop(path, None)
+        self._pending_saves.pop(path, None)
+        if os.path.dirname(os.path.abspath(path)) != os.path.abspath(self._tmp_dir):
+            return
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _discard_future_result(self, fut: asyncio.Future):
+        if fut.cancelled() or fut.exception() is not None:
+            return
+        self._discard_temp(fut.result())
+
+    def _discard_task_result(self, task: asyncio.Task):
+        if task.cancelled() or task.exception() is not None:
+            return
+        self._release_temp(task.result())
+
+    async def _hedged_fetch(self, candidates: List[_PigImage],
+                            profile: str = "") -> Optional[Tuple[_PigImage, str]]:
+        """
+        对冲下载：先启动第一个候选，hedge_delay 秒内未完成（或已失败）就再启动下一个，
+        取最先成功的结果，其余任务取消，迟到的临时文件随后删除。
+        """
+        queue = list(candidates)
+        pending: Dict[asyncio.Task, _PigImage] = {}
+
+        def launch() -> bool:
+            if not queue:
+                return False
+            img = queue.pop(0)
+            pending[asyncio.create_task(self._fetch_candidate(img, profile))] = img
+            return True
+
+        launch()
+        winner: Optional[Tuple[_PigImage, str]] = None
+        try:
+            while pending:
+                done, _ = await asyncio.wait(
+                    pending, timeout=self.hedge_delay, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    launch()
+                    continue
+                for t in done:
+                    img = pending.pop(t)
+                    path = None
+                    if not t.cancelled() and t.exception() is None:
+                        path = t.result()
+                    if path and winner is None:
+                        winner = (img, path)
+                    else:
+                        self._release_temp(path)
+                if winner:
+                    return winner
+                if not pending:
+                    launch()
+            return None
+        finally:
+            for t in pending:
+                t.cancel()
+                t.add_done_callback(self._discard_task_result)
+
+    # ── 预热 ───────────────────────────────────────────────────────────────
+    # 预热进度写入 warm_state.json；未完成时下次启动自动续跑，已缓存的图直接跳过。
+    # 每张图下载前等待用户请求空闲；下载走独立槽位，所有预热下载共享 warm_rate_kbps 的全局限速。
+
+    def _load_warm_state(self) -> dict:
+        try:
+            with open(self._warm_state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            return state if isinstance(state, dict) else {}
+        except Exception:
+            return {}
+
+    def _save_warm_state(self, state: dict):
+        try:
+            with open(self._warm_state_path, "w", encoding="utf-8") as f:
+                json.dump(state, f)
+        except Exception as e:
+            logger.debug("保存预热进度失败：%s", e)
+
+    def _is_warm(self, img: _PigImage) -> bool:
+        if self.load_to_local:
+            return self._local_cache is not None and img.filename in self._local_cache
+        return self._converted_cache is not None and self._cache_key(img) in self._converted_cache
+
+    def _start_warm(self, top_n: int) -> bool:
+        if self._warm_task and not self._warm_task.done():
+            return False
+        if not self.load_to_local and self._converted_cache is None:
+            logger.warning("预热跳过：本地缓存与转换缓存均未开启")
+            return False
+        self._warm_task = asyncio.create_task(self._warm_run(top_n))
+        return True
+
+    async def _warm_run(self, top_n: int):
+        _BACKGROUND_FETCH.set(True)
+        items = sorted(self.pig_images, key=lambda i: i.popularity, reverse=True)
+        if top_n > 0:
+            items = items[:top_n]
+        self._save_warm_state({"pending": True, "top_n": top_n})
+        self._warm_progress = {"total": len(items), "done": 0, "skipped": 0, "failed": 0}
+        queue: asyncio.Queue = asyncio.Queue()
+        for img in items:
+            queue.put_nowait(img)
+        logger.info("预热开始：共 %d 张", len(items))
+        try:
+            await asyncio.gather(*(
+                self._warm_worker(queue) for _ in range(self.warm_concurrency)
+            ))
+        except asyncio.CancelledError:
+            logger.info("预热已中断，进度：%s", self._warm_progress)
+            raise
+        self._save_warm_state({"pending": False, "top_n": top_n})
+        logger.info("预热完成：%s", self._warm_progress)
+
+    async def _warm_worker(self, queue: asyncio.Queue):
+        progress = self._warm_progress
+        while True:
+            try:
+                img = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            if self._is_warm(img):
+                progress["skipped"] += 1
+                continue
+            # 有用户请求在处理时让路
+            await self._user_idle.wait()
+            try:
+                if self.load_to_local:
+                    path = await self._get_local_image(img, background=True)
+                else:
+                    path = await self._get_converted_image(img, background=True)
+            except Exception as e:
+                logger.debug("预热出错：%s", e)
+                path = None
+            if not path:
+                progress["failed"] += 1
+                continue
+            progress["done"] += 1
+            finished = progress["done"] + progress["failed"] + progress["skipped"]
+            if finished % 50 == 0:
+                logger.info("预热进度：%d/%d", finished, progress["total"])
+
+    async def _cancel_warm(self):
+        task, self._warm_task = self._warm_task, None
+        if task and not task.done():
+            task.cancel()
+            try:
+                await asyncio.wait_for(task, timeout=5)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                pass
+
+    async def _do_warm_command(self, event: AstrMessageEvent, args: Tuple[str, ...]):
+        is_admin = getattr(event, "is_admin", None)
+        if callable(is_admin) and not is_admin():
+            yield event.plain_result("[Pig] 预热仅限管理员使用")
+            return
+        sub = args[0].lower() if args else ""
+        if sub in ("status", "状态"):
+            running = bool(self._warm_task and not self._warm_task.done())
+            p = self._warm_progress
+            if not p:
+                yield event.plain_result("[Pig] 尚未执行过预热")
+                return
+            finished = p["done"] + p["failed"] + p["skipped"]
+            yield event.plain_result(
+                f"[Pig] 预热{'进行中' if running else '已结束'}：{finished}/{p['total']}"
+                f"（新下载 {p['done']}，已缓存 {p['skipped']}，失败 {p['failed']}）"
+            )
+            return
+        if sub in ("stop", "停止"):
+            await self._cancel_warm()
+            self._save_warm_state({"pending": False})
+            yield event.plain_result("[Pig] 预热已停止")
+            return
+        top_n = int(sub) if sub.isdecimal() else self.warm_top_n
+        if self._start_warm(top_n):
+            scope = f"热度前 {top_n} 张" if top_n > 0 else "全部图片"
+            yield event.plain_result(f"[Pig] 开始后台预热{scope}，可用 /pig warm status 查看进度")
+        elif self._warm_task and not self._warm_task.done():
+            yield event.plain_result("[Pig] 预热已在进行中")
+        else:
+            yield event.plain_result("[Pig] 无法预热：请先开启本地缓存或转换缓存")
+
     # ── 发图主流程 ─────────────────────────────────────────────────────────
 
-    async def _get_random_pig_image(self, event: AstrMessageEvent):
-        key = "pig"
+    def _chat_key(self, event: AstrMessageEvent) -> str:
+        origin = getattr(event, "unified_msg_origin", None)
+        if origin:
+            return str(origin)
+        try:
+            return str(event.get_group_id() or event.get_sender_id() or "")
+        except Exception:
+            return ""
+
+    def _search_candidates(self, keyword: str, image_filter: str,
+                           exclude: Optional[Any], k: int) -> List[_PigImage]:
+        """标题包含 keyword 的图中随机取至多 k 张，尽量避开最近发过的。"""
+        hits = self._title_index.search(keyword)
+        if image_filter != "all":
+            want = image_filter == "animated"
+            hits = [img for img in hits if img.animated == want]
+        if exclude:
+            fresh = [img for img in hits if img.uid not in exclude]
+            hits = fresh if len(fresh) >= min(k, len(hits)) else hits
+        return random.sample(hits, min(k, len(hits)))
+
+    async def _get_random_pig_image(self, event: AstrMessageEvent,
+                                    strategy: Optional[str] = None,
+                                    image_filter: Optional[str] = None,
+                                    keyword: Optional[str] = None,
+                                    count: int = 1):
+        """用户触发的发图入口：处理期间标记为忙碌，让预热任务暂停让路。"""
+        self._user_active += 1
+        self._user_idle.clear()
+        self._metrics.incr("requests")
+        t0 = time.perf_counter()
+        try:
+            if count > 1:
+                gen = self._send_pig_batch(event, count, strategy, image_filter, keyword)
+            else:
+                gen = self._send_random_pig_image(event, strategy, image_filter, keyword)
+            async for r in gen:
+                yield r
+        finally:
+            self._metrics.observe("request", time.perf_counter() - t0)
+            self._user_active -= 1
+            if self._user_active <= 0:
+                self._user_idle.set()
+
+    async def _send_random_pig_image(self, event: AstrMessageEvent,
+                                     strategy: Optional[str],
+                                     image_filter: Optional[str],
+                                     keyword: Optional[str]):
+        t0 = time.perf_counter()
+        key = self._cooldown_key(event)
         on_cd, remaining = self._is_on_cooldown(key)
+        self._metrics.observe("cooldown", time.perf_counter() - t0)
         if on_cd:
+            self._metrics.incr("cooldown_rejected")
             yield event.plain_result(f"冷却中～还需 {remaining:.0f} 秒")
             return
 
@@ -608,42 +2704,212 @@ class PigRandomImagePlugin(Star):
             yield event.plain_result("无可用猪图数据，请稍后重试")
             return
 
-        tried: set = set()
-        max_candidates = min(len(self.pig_images), 3)
-        self._cleanup_tmp()
-        for _ in range(max_candidates):
-            idx = random.randrange(len(self.pig_images))
-            if idx in tried and len(tried) < len(self.pig_images):
-                continue
-            tried.add(idx)
-            selected_img = self.pig_images[idx]
-            img_title    = selected_img.get("title", "随机猪图")
-
-            if self.load_to_local:
-                try:
-                    img_path = await self._get_local_image(selected_img)
-                    if img_path:
-                        yield event.image_result(img_path)
-                        self.last_called_times[key] = time.time()
-                        return
-                    logger.debug("本地加载失败，切换为网络加载")
-                except Exception as e:
-                    logger.error(f"本地加载出错：{e}")
+        strategy = strategy or self.select_strategy
+        image_filter = image_filter or self.select_filter
+        chat = self._chat_key(event)
+        recent = self._recent.get(chat)
+        profile = self._output_profile(event)
+
+        # 预取池按默认策略、默认配置档填充，仅在条件一致且不与最近发送重复时直接取用
+        t0 = time.perf_counter()
+        ready = None
+        if (not keyword and not profile
+                and strategy == self.select_strategy and image_filter == self.select_filter):
+            ready = self._pop_prefetched()
+            if ready and recent is not None and ready[0].uid in recent:
+                self._prefetched.append(ready)
+                ready = None
+        self._schedule_prefetch()
+        if ready:
+            self._metrics.observe("select", time.perf_counter() - t0)
+            self._metrics.incr("prefetch_hit")
+            async for r in self._deliver(event, ready[0], ready[1], key, chat):
+                yield r
+            return
 
-            temp_path = await self._download_with_retries(
-                selected_img.get("full_url", ""), img_title
-            )
-            if temp_path:
-                yield event.image_result(temp_path)
-                self.last_called_times[key] = time.time()
-                if self.load_to_local:
-                    asyncio.create_task(
-                        self._save_to_local_cache_async(temp_path, selected_img.get("filename"))
-                    )
+        if keyword:
+            candidates = self._search_candidates(keyword, image_filter, recent, 3)
+            if not candidates:
+                yield event.plain_result(f"没有找到标题包含「{keyword}」的猪图")
+                return
+        else:
+            candidates = self._selector.sample(3, strategy, image_filter, exclude=recent)
+        self._metrics.observe("select", time.perf_counter() - t0)
+        if not candidates:
+            yield event.plain_result("没有符合条件的猪图")
+            return
+        if self.hedge_delay > 0:
+            result = await self._hedged_fetch(candidates, profile)
+            if result:
+                async for r in self._deliver(event, result[0], result[1], key, chat):
+                    yield r
                 return
+        else:
+            for selected_img in candidates:
+                img_path = await self._fetch_candidate(selected_img, profile)
+                if img_path:
+                    async for r in self._deliver(event, selected_img, img_path, key, chat):
+                        yield r
+                    return
 
+        self._metrics.incr("failed")
         yield event.plain_result("获取猪图失败，请稍后重试")
-        self.last_called_times[key] = time.time()
+        self._cooldown.charge(key)
+
+    async def _deliver(self, event: AstrMessageEvent, selected_img: _PigImage,
+                       path: str, key: str, chat: str):
+        """发送单张图并记账：释放临时文件、计入冷却与最近发送记录。"""
+        t0 = time.perf_counter()
+        try:
+            yield event.image_result(path)
+        finally:
+            self._metrics.observe("send", time.perf_counter() - t0)
+            self._release_temp(path)
+        self._metrics.incr("sent")
+        self._cooldown.charge(key)
+        self._recent.add(chat, selected_img.uid)
+
+    # QQ 官方机器人一条消息只能带一个富媒体，这些平台逐张发送
+    _SINGLE_IMAGE_PLATFORMS = frozenset({"qq_official", "qq_official_webhook"})
+
+    async def _send_pig_batch(self, event: AstrMessageEvent, count: int,
+                              strategy: Optional[str],
+                              image_filter: Optional[str],
+                              keyword: Optional[str]):
+        """
+        /pig <n>：一次抽取 n 张互不相同的图并发获取（下载仍受下载信号量限制），
+        平台支持时合并为一条消息发送；整批只计一次冷却。
+        """
+        t0 = time.perf_counter()
+        key = self._cooldown_key(event)
+        on_cd, remaining = self._is_on_cooldown(key)
+        self._metrics.observe("cooldown", time.perf_counter() - t0)
+        if on_cd:
+            self._metrics.incr("cooldown_rejected")
+            yield event.plain_result(f"冷却中～还需 {remaining:.0f} 秒")
+            return
+
+        if not self.pig_images:
+            yield event.plain_result("无可用猪图数据，请稍后重试")
+            return
+
+        count = min(count, self.batch_max)
+        strategy = strategy or self.select_strategy
+        image_filter = image_filter or self.select_filter
+        chat = self._chat_key(event)
+        recent = self._recent.get(chat)
+        profile = self._output_profile(event)
+
+        # 多抽几张备用，失败的位置由备用图补上
+        t0 = time.perf_counter()
+        spare = count + 3
+        if keyword:
+            candidates = self._search_candidates(keyword, image_filter, recent, spare)
+            if not candidates:
+                yield event.plain_result(f"没有找到标题包含「{keyword}」的猪图")
+                return
+        else:
+            candidates = self._selector.sample(spare, strategy, image_filter, exclude=recent)
+        self._metrics.observe("select", time.perf_counter() - t0)
+        if not candidates:
+            yield event.plain_result("没有符合条件的猪图")
+            return
+
+        results: List[Tuple[_PigImage, str]] = []
+        queue = list(candidates)
+        while queue and len(results) < count:
+            batch, queue = queue[:count - len(results)], queue[count - len(results):]
+            paths = await asyncio.gather(
+                *(self._fetch_candidate(img, profile) for img in batch),
+                return_exceptions=True,
+            )
+            for img, path in zip(batch, paths):
+                if isinstance(path, BaseException):
+                    logger.debug("批量获取出错：%s", path)
+                elif path:
+                    results.append((img, path))
+
+        self._cooldown.charge(key)
+        if not results:
+            self._metrics.incr("failed")
+            yield event.plain_result("获取猪图失败，请稍后重试")
+            return
+
+        try:
+            platform = str(event.get_platform_name() or "").lower()
+        except Exception:
+            platform = ""
+        t0 = time.perf_counter()
+        try:
+            if platform in self._SINGLE_IMAGE_PLATFORMS:
+                for _, path in results:
+                    yield event.image_result(path)
+            else:
+                yield event.chain_result([Comp.Image.fromFileSystem(path) for _, path in results])
+            self._metrics.incr("sent", len(results))
+        finally:
+            self._metrics.observe("send", time.perf_counter() - t0)
+            for img, path in results:
+                self._release_temp(path)
+                self._recent.add(chat, img.uid)
+
+    # ── 运行指标 ───────────────────────────────────────────────────────────
+
+    def _metric_gauges(self) -> Dict[str, float]:
+        gauges: Dict[str, float] = {
+            "uptime_seconds": round(time.time() - self._metrics.started, 1),
+            "catalog_images": len(self.pig_images),
+            "prefetched_images": len(self._prefetched),
+            "tmp_files": len(self._tmp_files),
+        }
+        for name, cache in (("converted", self._converted_cache), ("local", self._local_cache)):
+            if cache is None:
+                continue
+            for k, v in cache.stats().items():
+                gauges[f"{name}_cache_{k}"] = v
+        return gauges
+
+    def _dump_metrics(self):
+        tmp = self.metrics_file + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(self._metrics.prometheus(self._metric_gauges()))
+            os.replace(tmp, self.metrics_file)
+        except OSError as e:
+            logger.debug("导出运行指标失败：%s", e)
+
+    async def _metrics_dump_task(self):
+        try:
+            while True:
+                await asyncio.sleep(self.metrics_dump_interval)
+                self._dump_metrics()
+        except asyncio.CancelledError:
+            pass
+
+    async def _do_stats_command(self, event: AstrMessageEvent, args: Tuple[str, ...]):
+        if args and args[0].lower() in ("prom", "prometheus"):
+            yield event.plain_result(self._metrics.prometheus(self._metric_gauges()))
+            return
+        m = self._metrics
+        c = m.counters
+        hours = (time.time() - m.started) / 3600
+        lines = [
+            f"[Pig] 运行统计（已运行 {hours:.1f} 小时）",
+            f"请求 {c.get('requests', 0)}｜发送 {c.get('sent', 0)}｜失败 {c.get('failed', 0)}"
+            f"｜冷却拦截 {c.get('cooldown_rejected', 0)}｜预取命中 {c.get('prefetch_hit', 0)}",
+            f"下载失败 {c.get('download_failed', 0)}｜下载流量 {c.get('download_bytes', 0) / 1048576:.1f}MB"
+            f"（后台 {c.get('background_download_bytes', 0) / 1048576:.1f}MB）"
+            f"｜转换失败 {c.get('convert_failed', 0)}｜转换池繁忙 {c.get('convert_busy', 0)}",
+        ]
+        for name, cache in (("转换缓存", self._converted_cache), ("本地图库", self._local_cache)):
+            if cache is not None:
+                st = cache.stats()
+                lines.append(
+                    f"{name}：{st['entries']} 张 / {st['bytes'] / 1048576:.1f}MB，"
+                    f"命中 {st['hits']}，未命中 {st['misses']}，淘汰 {st['evictions']}"
+                )
+        lines.extend(m.summary())
+        yield event.plain_result("\n".join(lines))
 
     # ── 定时更新调度 ───────────────────────────────────────────────────────
 
@@ -705,24 +2971,59 @@ class PigRandomImagePlugin(Star):
 
     # ── 指令 ───────────────────────────────────────────────────────────────
 
-    @filter.regex(r"(?i)^[/／]?pig(?:\s+(update|更新))?$")
+    @filter.regex(_PIG_FILTER_RE)
     async def pig_command(self, event: AstrMessageEvent):
         """
         /pig        — 发送随机猪图
         /pig update — 手动刷新图片列表
         /pig 更新  — 同上
+        /pig hot|new|uniform     — 按热度 / 上传时间 / 均匀随机选图（热门 / 最新 / 随机）
+        /pig static|gif          — 仅静图 / 仅动图（静图 / 动图），可与上一项组合
+        /pig <关键词>            — 随机发送一张标题包含关键词的猪图
+        /pig <n>                 — 一次发送 n 张（不超过 batch_max），可与以上选项组合
+        /pig warm [N|status|stop] — 后台预热全部 / 热度前 N 张图片，查看进度或停止（预热）
+        /pig stats [prom]        — 查看各阶段耗时与缓存统计，prom 输出 Prometheus 文本（统计）
         """
         raw   = getattr(event, "message_str", None) or getattr(event, "message", "") or ""
-        clean = self._clean_text(str(raw))
-        m     = re.match(r"(?i)^[/／]?pig(?:\s+(.+))?$", clean)
-        sub   = (m.group(1) or "").strip().lower() if m else ""
-        if sub in ("update", "更新"):
+        cmd   = _parse_pig_command(self._clean_text(str(raw))) or _PigCommand("", ())
+        if cmd.name and not self._is_explicit_command(event, str(raw)):
+            if cmd.args or cmd.name not in ("update", "更新"):
+                return
+        if cmd.name in ("update", "更新"):
             async for r in self._do_manual_update(event):
                 yield r
             return
-        async for r in self._get_random_pig_image(event):
+        if cmd.name in ("warm", "预热"):
+            async for r in self._do_warm_command(event, cmd.args):
+                yield r
+            return
+        if cmd.name in ("stats", "统计"):
+            async for r in self._do_stats_command(event, cmd.args):
+                yield r
+            return
+        options = {"strategy": None, "filter": None}
+        words: List[str] = []
+        count = 1
+        for token in ((cmd.name,) + cmd.args if cmd.name else ()):
+            kind, value = _SELECT_ALIASES.get(token.lower(), (None, None))
+            if kind:
+                options[kind] = value
+            elif token.isdecimal() and count == 1 and len(token) <= 3:
+                count = max(1, int(token))
+            else:
+                words.append(token)
+        async for r in self._get_random_pig_image(
+            event, options["strategy"], options["filter"], " ".join(words) or None, count
+        ):
             yield r
 
+    @staticmethod
+    def _is_explicit_command(event: AstrMessageEvent, raw: str) -> bool:
+        """消息以斜杠开头（可在 At 之后），或已被框架判定为唤醒 / @ 机器人的指令。"""
+        if getattr(event, "is_at_or_wake_command", False):
+            return True
+        return bool(_SLASH_CMD_RE.match(raw))
+
     @filter.event_message_type(filter.EventMessageType.GROUP_MESSAGE)
     async def keyword_trigger(self, event: AstrMessageEvent):
         if not self.is_match_all_msg:
@@ -734,12 +3035,16 @@ class PigRandomImagePlugin(Star):
             async for r in self._get_random_pig_image(event):
                 yield r
 
+    def _get_matcher(self, keywords: list) -> _KeywordMatcher:
+        """关键词列表或匹配模式变化时才重新编译匹配器。"""
+        src = (keywords, self.is_exact_match)
+        if self._matcher is None or src[0] is not self._matcher_src[0] or src[1] != self._matcher_src[1]:
+            self._matcher = _KeywordMatcher(keywords, fuzzy=not self.is_exact_match)
+            self._matcher_src = src
+        return self._matcher
+
     def _is_trigger_keyword(self, message: str, keywords: list) -> bool:
-        if message.strip() in keywords:
-            return True
-        if not self.is_exact_match:
-            return any(kw in message for kw in keywords)
-        return False
+        return self._get_matcher(keywords).match(message)
 
     # ── 卸载 ───────────────────────────────────────────────────────────────
 
@@ -755,4 +3060,24 @@ class PigRandomImagePlugin(Star):
                 logger.debug("取消调度任务出错：%s", e)
             finally:
                 self._scheduler_task = None
+        if self._refresh_task and not self._refresh_task.done():
+            self._refresh_task.cancel()
+            try:
+                await asyncio.wait_for(self._refresh_task, timeout=5)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                pass
+        self._refresh_task = None
+        if self._janitor_task and not self._janitor_task.done():
+            self._janitor_task.cancel()
+        self._janitor_task = None
+        if self._metrics_task and not self._metrics_task.done():
+            self._metrics_task.cancel()
+            self._dump_metrics()
+        self._metrics_task = None
+        await self._cancel_warm()
+        await self._cancel_prefetch()
+        await self._close_session()
+        self._shutdown_convert_pool()
+        if self._converted_cache is not None:
+            logger.info("转换缓存统计：%s", self._converted_cache.stats())
         logger.info("猪图插件 v0.1.6 已卸载")
\ No newline at end of file
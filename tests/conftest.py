@@ -0,0 +1,129 @@
+"""
+测试公共设施：
+  - 未安装 AstrBot 时注入最小的 astrbot 桩模块，仅够 main.py 导入；
+  - make_plugin：插件目录指向 tmp_path，list.json、快照、imgs/ 均写在临时目录；
+  - serve：在本机随机端口起 aiohttp 桩服务器，返回基础 URL。
+测试函数本身是同步的，用 asyncio.run 驱动协程（不依赖 pytest-asyncio）。
+"""
+
+import contextlib
+import importlib.util
+import io
+import json
+import logging
+import os
+import sys
+import types
+
+import pytest
+from aiohttp import web
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _install_astrbot_stub():
+    class _Filter:
+        class EventMessageType:
+            GROUP_MESSAGE = "group"
+            ALL = "all"
+
+        def __getattr__(self, name):
+            return lambda *a, **k: (lambda f: f)
+
+    class Star:
+        def __init__(self, context, config=None):
+            self.context = context
+
+    class Image_:
+        @staticmethod
+        def fromFileSystem(path):
+            return ("image", path)
+
+    event = types.ModuleType("astrbot.api.event")
+    event.filter = _Filter()
+    event.AstrMessageEvent = object
+    star = types.ModuleType("astrbot.api.star")
+    star.Star = Star
+    star.Context = object
+    star.register = lambda *a, **k: (lambda cls: cls)
+    components = types.ModuleType("astrbot.api.message_components")
+    components.Image = Image_
+    api = types.ModuleType("astrbot.api")
+    api.AstrBotConfig = dict
+    api.logger = logging.getLogger("astrbot")
+    api.message_components = components
+    sys.modules.update({
+        "astrbot": types.ModuleType("astrbot"),
+        "astrbot.api": api,
+        "astrbot.api.event": event,
+        "astrbot.api.star": star,
+        "astrbot.api.message_components": components,
+    })
+
+
+try:
+    import astrbot.api  # noqa: F401
+except ImportError:
+    _install_astrbot_stub()
+
+
+@pytest.fixture(scope="session")
+def pig_main():
+    spec = importlib.util.spec_from_file_location("pig_main", os.path.join(ROOT, "main.py"))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["pig_main"] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def make_plugin(pig_main, tmp_path, monkeypatch):
+    """构造插件；images 非 None 时先写入 list.json。须在事件循环内调用。"""
+    monkeypatch.setattr(pig_main, "__file__", str(tmp_path / "main.py"))
+
+    def make(images=None, **config):
+        if images is not None:
+            with open(tmp_path / "list.json", "w", encoding="utf-8") as f:
+                json.dump({"images": images, "total": len(images)}, f, ensure_ascii=False)
+        conf = dict(prefetch_depth=0, cooldown_period=0, converted_cache_mb=0)
+        conf.update(config)
+        return pig_main.PigRandomImagePlugin(None, conf)
+
+    return make
+
+
+def catalog(n, ext="png"):
+    """n 条最小的目录条目。"""
+    return [
+        {"id": str(i), "mtime": 1700000000 + i, "title": f"测试猪{i}",
+         "filename": f"pig_{i}.{ext}", "image_type": "static"}
+        for i in range(n)
+    ]
+
+
+def image_bytes(fmt="PNG", size=(64, 64), color=(200, 120, 120)):
+    buf = io.BytesIO()
+    Image.new("RGB", size, color).save(buf, fmt)
+    return buf.getvalue()
+
+
+@pytest.fixture
+def serve():
+    """serve(handler) 为异步上下文管理器，所有路径都交给 handler，产出 "http://127.0.0.1:port/"。"""
+
+    @contextlib.asynccontextmanager
+    async def _serve(handler):
+        app = web.Application()
+        app.router.add_route("*", "/{tail:.*}", handler)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        try:
+            yield f"http://127.0.0.1:{port}/"
+        finally:
+            await runner.cleanup()
+
+    return _serve
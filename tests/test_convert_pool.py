@@ -0,0 +1,57 @@
+import asyncio
+import io
+import os
+import time
+
+from PIL import Image, ImageChops
+
+# 转换期间事件循环的最大允许延迟（秒）；单张测试动图的转换耗时远高于此
+MAX_LAG = 0.25
+TICK = 0.01
+
+
+def _animated_gif(frames=20, size=800):
+    base = Image.radial_gradient("L").resize((size, size))
+    seq = [ImageChops.offset(base, i * 7, i * 3) for i in range(frames)]
+    buf = io.BytesIO()
+    seq[0].save(buf, "GIF", save_all=True, append_images=seq[1:], duration=40, loop=0)
+    return buf.getvalue()
+
+
+def test_gif_conversion_does_not_block_event_loop(make_plugin):
+    data = _animated_gif()
+
+    async def main():
+        plugin = make_plugin([], convert_workers=2, convert_queue_size=2)
+        lag = 0.0
+        stop = asyncio.Event()
+
+        async def ticker():
+            nonlocal lag
+            while not stop.is_set():
+                t0 = time.perf_counter()
+                await asyncio.sleep(TICK)
+                lag = max(lag, time.perf_counter() - t0 - TICK)
+
+        tick_task = asyncio.create_task(ticker())
+        try:
+            await asyncio.sleep(TICK * 3)
+            results = await asyncio.gather(*(plugin._convert_in_pool(data) for _ in range(4)))
+        finally:
+            stop.set()
+            await tick_task
+            await plugin.terminate()
+
+        for path in results:
+            assert path and os.path.exists(path)
+            with Image.open(path) as im:
+                assert im.format == "GIF"
+                assert max(im.size) <= plugin._convert_opts.gif_max_edge
+                assert im.n_frames > 1
+        convert = plugin._metrics.stages["convert"]
+        assert convert.count == 4
+        # 工作量要足以让同步转换明显卡住事件循环，否则此测试没有意义
+        assert convert.total / convert.count > MAX_LAG
+        assert lag < MAX_LAG
+
+    asyncio.run(main())
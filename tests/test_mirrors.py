@@ -0,0 +1,92 @@
+import asyncio
+import contextlib
+import time
+
+from aiohttp import web
+
+from conftest import catalog, image_bytes
+
+BODY = image_bytes("WEBP")
+
+
+class _MirrorStub:
+    """可调延迟、可切换为故障（返回 503）的镜像桩。"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.failing = False
+        self.hits = 0
+
+    async def handler(self, request):
+        self.hits += 1
+        await asyncio.sleep(self.delay)
+        if self.failing:
+            return web.Response(status=503, text="unavailable")
+        return web.Response(body=BODY, content_type="image/webp")
+
+
+async def _download(plugin, img):
+    path = await plugin._download_with_retries(img)
+    plugin._discard_temp(path)
+    return path
+
+
+def _mirror(plugin, base):
+    return next(m for m in plugin._mirrors if m.base == base)
+
+
+def test_downloads_move_to_faster_mirror(make_plugin, serve):
+    slow, fast = _MirrorStub(delay=0.1), _MirrorStub()
+
+    async def main():
+        async with contextlib.AsyncExitStack() as stack:
+            slow_base = await stack.enter_async_context(serve(slow.handler))
+            fast_base = await stack.enter_async_context(serve(fast.handler))
+            plugin = make_plugin(catalog(1), mirrors=[slow_base, fast_base], max_retries=1)
+            stack.push_async_callback(plugin.terminate)
+            img = plugin.pig_images[0]
+
+            # 新镜像都会先被探测一次，之后固定选延迟更低的那个
+            for _ in range(6):
+                assert await _download(plugin, img)
+            assert slow.hits == 1
+            assert fast.hits == 5
+            assert _mirror(plugin, fast_base).latency < _mirror(plugin, slow_base).latency
+            assert plugin._image_urls(img)[0][0].base == fast_base
+
+    asyncio.run(main())
+
+
+def test_failing_mirror_fails_over_and_leaves_rotation(make_plugin, serve):
+    primary, backup = _MirrorStub(), _MirrorStub(delay=0.05)
+
+    async def main():
+        async with contextlib.AsyncExitStack() as stack:
+            primary_base = await stack.enter_async_context(serve(primary.handler))
+            backup_base = await stack.enter_async_context(serve(backup.handler))
+            plugin = make_plugin(catalog(1), mirrors=[primary_base, backup_base], max_retries=2)
+            stack.push_async_callback(plugin.terminate)
+            img = plugin.pig_images[0]
+            bad = _mirror(plugin, primary_base)
+
+            for _ in range(4):
+                assert await _download(plugin, img)
+            assert plugin._image_urls(img)[0][0] is bad
+            primary.hits = backup.hits = 0
+
+            # 首选镜像开始故障：同一次下载内切换到下一个镜像完成
+            primary.failing = True
+            assert await _download(plugin, img)
+            assert (primary.hits, backup.hits) == (1, 1)
+            assert bad.healthy(time.monotonic())
+
+            # 错误率越过阈值后下线，排到末尾，之后不再被请求
+            assert await _download(plugin, img)
+            assert not bad.healthy(time.monotonic())
+            assert plugin._image_urls(img)[-1][0] is bad
+            primary.hits = backup.hits = 0
+            for _ in range(3):
+                assert await _download(plugin, img)
+            assert (primary.hits, backup.hits) == (0, 3)
+
+    asyncio.run(main())
@@ -0,0 +1,127 @@
+import asyncio
+import json
+import os
+
+from aiohttp import web
+
+from conftest import catalog
+
+ETAG = '"v2"'
+LAST_MODIFIED = "Sat, 17 Oct 2026 00:00:00 GMT"
+
+
+class _Api:
+    """模拟 pighub 列表接口：带 ETag / Last-Modified，条件头匹配时返回 304。"""
+
+    def __init__(self, images):
+        self.images = images
+        self.requests = []
+
+    async def handler(self, request):
+        self.requests.append(dict(request.headers))
+        if request.headers.get("If-None-Match") == ETAG:
+            return web.Response(status=304)
+        body = json.dumps({"code": 0, "message": "OK", "data": self.images})
+        return web.Response(
+            text=body, content_type="application/json",
+            headers={"ETag": ETAG, "Last-Modified": LAST_MODIFIED},
+        )
+
+
+class _Event:
+    def plain_result(self, text):
+        return ("plain", text)
+
+
+def _use_api(monkeypatch, pig_main, base):
+    monkeypatch.setattr(pig_main, "PIGHUB_API", base + "api/images")
+
+
+def test_conditional_headers_only_with_loaded_catalog(make_plugin, serve, pig_main, monkeypatch, tmp_path):
+    api = _Api(catalog(3))
+    (tmp_path / "list_meta.json").write_text(
+        json.dumps({"etag": ETAG, "last_modified": LAST_MODIFIED}), encoding="utf-8"
+    )
+
+    async def main():
+        async with serve(api.handler) as base:
+            _use_api(monkeypatch, pig_main, base)
+
+            # 没有本地目录：即便有旧的校验信息也必须拉全量
+            empty = make_plugin()
+            try:
+                assert empty.pig_images == []
+                assert await empty._fetch_remote_images() == {"images": api.images}
+            finally:
+                await empty.terminate()
+            assert "If-None-Match" not in api.requests[-1]
+            assert "If-Modified-Since" not in api.requests[-1]
+
+            loaded = make_plugin(catalog(3))
+            try:
+                assert await loaded._fetch_remote_images() == {"not_modified": True}
+            finally:
+                await loaded.terminate()
+            assert api.requests[-1]["If-None-Match"] == ETAG
+            assert api.requests[-1]["If-Modified-Since"] == LAST_MODIFIED
+
+    asyncio.run(main())
+
+
+def test_not_modified_skips_parse_and_apply(make_plugin, serve, pig_main, monkeypatch, tmp_path):
+    api = _Api(catalog(3))
+    (tmp_path / "list_meta.json").write_text(json.dumps({"etag": ETAG}), encoding="utf-8")
+
+    def fail(*args):
+        raise AssertionError("304 后不应解析或应用远程数据")
+
+    async def main():
+        async with serve(api.handler) as base:
+            _use_api(monkeypatch, pig_main, base)
+            plugin = make_plugin(catalog(3))
+            entries = dict(plugin._catalog_entries)
+            images = plugin.pig_images
+            list_json = (tmp_path / "list.json").read_bytes()
+            monkeypatch.setattr(pig_main, "_parse_api_payload", fail)
+            monkeypatch.setattr(plugin, "_make_entry", fail)
+            monkeypatch.setattr(plugin, "_save_snapshot", fail)
+            try:
+                out = [r async for r in plugin._do_manual_update(_Event())]
+            finally:
+                await plugin.terminate()
+            assert out == [("plain", "[Pig] 手动更新完成：本地已是最新")]
+            assert plugin._catalog_entries == entries
+            assert plugin.pig_images is images
+            assert (tmp_path / "list.json").read_bytes() == list_json
+
+    asyncio.run(main())
+
+
+def test_fetch_meta_not_saved_when_list_write_fails(make_plugin, serve, pig_main, monkeypatch, tmp_path):
+    api = _Api(catalog(4))
+
+    async def main():
+        async with serve(api.handler) as base:
+            _use_api(monkeypatch, pig_main, base)
+            plugin = make_plugin(catalog(3))
+            try:
+                json_path = plugin.json_path
+                # 目标目录不存在，写入 list.json 的临时文件必然失败
+                plugin.json_path = str(tmp_path / "missing" / "list.json")
+                remote = await plugin._fetch_remote_images()
+                assert plugin._apply_remote_data_if_needed(remote) is False
+                assert plugin._fetch_meta == {}
+                assert not os.path.exists(plugin._fetch_meta_path)
+                assert len(plugin.pig_images) == 3
+
+                # 下一次拉取仍须是无条件请求，才能拿到全量数据重试
+                plugin.json_path = json_path
+                remote = await plugin._fetch_remote_images()
+                assert "If-None-Match" not in api.requests[-1]
+                assert plugin._apply_remote_data_if_needed(remote) is True
+                assert plugin._fetch_meta == {"etag": ETAG, "last_modified": LAST_MODIFIED}
+                assert len(plugin.pig_images) == 4
+            finally:
+                await plugin.terminate()
+
+    asyncio.run(main())
@@ -0,0 +1,79 @@
+import asyncio
+import os
+
+from aiohttp import web
+
+from conftest import catalog, image_bytes
+
+BODY = image_bytes("WEBP")
+
+
+def _tmp_files(plugin):
+    return sorted(f for f in os.listdir(plugin._tmp_dir) if f.startswith("pig_"))
+
+
+def _slow_server(hits, delay):
+    async def handler(request):
+        hits.append(request.path)
+        await asyncio.sleep(delay)
+        return web.Response(body=BODY, content_type="image/webp")
+    return handler
+
+
+def test_concurrent_callers_share_one_download(make_plugin, serve):
+    n = 10
+    hits = []
+
+    async def main():
+        async with serve(_slow_server(hits, 0.2)) as base:
+            plugin = make_plugin(catalog(1), mirrors=[base])
+            img = plugin.pig_images[0]
+            try:
+                paths = await asyncio.gather(*(plugin._fetch_candidate(img) for _ in range(n)))
+                assert len(hits) == 1
+                assert len(set(paths)) == 1
+                path = paths[0]
+                assert plugin._tmp_refs[path] == n
+
+                for _ in range(n - 1):
+                    plugin._release_temp(path)
+                    assert os.path.exists(path)
+                plugin._release_temp(path)
+                assert not os.path.exists(path)
+                assert path not in plugin._tmp_files
+                assert _tmp_files(plugin) == []
+            finally:
+                await plugin.terminate()
+
+    asyncio.run(main())
+
+
+def test_cancelling_last_waiter_cancels_download(make_plugin, serve):
+    hits = []
+
+    async def main():
+        async with serve(_slow_server(hits, 2.0)) as base:
+            plugin = make_plugin(catalog(1), mirrors=[base])
+            img = plugin.pig_images[0]
+            try:
+                waiter = asyncio.create_task(plugin._fetch_candidate(img))
+                while not hits:
+                    await asyncio.sleep(0.01)
+                assert len(plugin._inflight) == 1
+
+                waiter.cancel()
+                try:
+                    await waiter
+                except asyncio.CancelledError:
+                    pass
+                await asyncio.sleep(0.1)
+
+                assert plugin._inflight == {}
+                assert plugin._inflight_waiters == {}
+                assert plugin._tmp_files == {}
+                assert _tmp_files(plugin) == []
+                assert plugin._metrics.counters.get("download_cancelled") == 1
+            finally:
+                await plugin.terminate()
+
+    asyncio.run(main())